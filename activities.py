@@ -0,0 +1,168 @@
+import numpy as np
+
+from strava.geo import encode as geohash_encode
+from strava.polyline import TIERS, build_tiers
+
+METRES_TO_MILES = 0.000621371
+METRES_TO_FEET = 3.28084
+
+# Columns are named like the fields of strava.models.Strava so a batch can be handed straight to the DB loader.
+# Float columns use NaN for missing values, which become NULLs on the way out.
+ACTIVITY_DTYPE = np.dtype([('activity_id', np.int64),
+                           ('name', object),
+                           ('_date', 'datetime64[D]'),
+                           ('distance_miles', np.float64),
+                           ('avg_power', np.float64),
+                           ('moving_time_seconds', np.float64),
+                           ('elapsed_time_seconds', np.float64),
+                           ('kudos_count', np.int32),
+                           ('elevation_feet', np.float64),
+                           ('kilojoules', np.float64),
+                           ('country', object),
+                           ('city', object),
+                           ('latitude', np.float64),
+                           ('longitude', np.float64),
+                           ('geohash', object),
+                           ('is_stationary_trainer', np.bool_),
+                           ('photo_count', np.int32)] +
+                          [(field, object) for field, _, _ in TIERS])
+# float columns which are stored as whole numbers
+INTEGER_FIELDS = ('moving_time_seconds', 'elapsed_time_seconds')
+
+
+def quantities_to_array(quantities):
+    """
+    :param quantities: units.quantity.Quantity instances (or plain numbers / None)
+    :return: float array of the underlying numbers with NaN for anything missing
+    """
+    return np.array([np.nan if qnty is None else getattr(qnty, 'get_num', lambda: qnty)() for qnty in quantities],
+                    dtype=np.float64)
+
+
+def optional_floats(values):
+    return np.array([np.nan if value is None else value for value in values], dtype=np.float64)
+
+
+def metres_to_miles(metres):
+    """
+    Converts from metres to miles seeing as we live in the UK. We DON'T TALK IN KM's!!!
+    """
+    return metres * METRES_TO_MILES
+
+
+def metres_to_feet(metres):
+    return metres * METRES_TO_FEET
+
+
+def timedeltas_to_seconds(timedeltas):
+    """
+    :param timedeltas: datetime.timedelta objects (or None)
+    :return: float array of seconds with NaN for anything missing
+    """
+    deltas = np.array(list(timedeltas), dtype='timedelta64[us]')
+    seconds = deltas.astype(np.float64) / 1e6
+    seconds[np.isnat(deltas)] = np.nan
+    return seconds
+
+
+def real_watts(device_watts, watts):
+    """
+    Only keeps the average power where it came from an actual powermeter. Estimated watts are garbage data.
+    :param device_watts: boolean flags
+    :param watts: average powers
+    :return: average powers with NaN wherever the power was estimated
+    """
+    return np.where(np.asarray(device_watts) == True, watts, np.nan)
+
+
+class ActivityBatch(object):
+
+    """
+    Compact, column oriented batch of activities backed by a NumPy structured array
+    """
+
+    def __init__(self, data):
+        """
+        :param data: structured array with ACTIVITY_DTYPE
+        """
+        self.data = data
+
+    @classmethod
+    def empty(cls):
+        return cls(np.empty(0, dtype=ACTIVITY_DTYPE))
+
+    @classmethod
+    def from_activities(cls, activities):
+        """
+        Builds a batch from stravalib Activity objects, doing all of the unit conversions a column at a time
+        :param activities: list of stravalib.model.Activity
+        :return: ActivityBatch
+        """
+        data = np.empty(len(activities), dtype=ACTIVITY_DTYPE)
+        if not activities:
+            return cls(data)
+
+        def column(attribute):
+            return [getattr(activity, attribute) for activity in activities]
+
+        data['activity_id'] = column('id')
+        data['name'] = column('name')
+        data['_date'] = [activity.start_date.strftime('%Y-%m-%d') for activity in activities]
+        data['distance_miles'] = metres_to_miles(quantities_to_array(column('distance')))
+        data['avg_power'] = real_watts(column('device_watts'), optional_floats(column('average_watts')))
+        data['moving_time_seconds'] = timedeltas_to_seconds(column('moving_time'))
+        data['elapsed_time_seconds'] = timedeltas_to_seconds(column('elapsed_time'))
+        data['kudos_count'] = [kudos or 0 for kudos in column('kudos_count')]
+        data['elevation_feet'] = metres_to_feet(quantities_to_array(column('total_elevation_gain')))
+        data['kilojoules'] = optional_floats(column('kilojoules'))
+        data['country'] = column('location_country')
+        data['city'] = column('location_city')
+        data['latitude'] = optional_floats(column('start_latitude'))
+        data['longitude'] = optional_floats(column('start_longitude'))
+        data['geohash'] = geohash_encode(data['latitude'], data['longitude'])
+        data['is_stationary_trainer'] = [bool(trainer) for trainer in column('trainer')]
+        data['photo_count'] = [photos or 0 for photos in column('total_photo_count')]
+        routes = [build_tiers(getattr(activity.map, 'summary_polyline', None)) for activity in activities]
+        for field, _, _ in TIERS:
+            data[field] = [route[field] for route in routes]
+        return cls(data)
+
+    @property
+    def fields(self):
+        return list(self.data.dtype.names)
+
+    def __len__(self):
+        return len(self.data)
+
+    def __getitem__(self, field):
+        return self.data[field]
+
+    def column_values(self, field):
+        """
+        :return: column as python objects, with None in place of NaN so the DB driver writes NULL
+        """
+        column = self.data[field]
+        values = column.astype(object)
+        if column.dtype.kind == 'f':
+            missing = np.isnan(column)
+            if field in INTEGER_FIELDS:
+                values[~missing] = np.round(column[~missing]).astype(np.int64).astype(object)
+            values[missing] = None
+        elif column.dtype.kind == 'M':
+            values = column.tolist()
+        return values
+
+    def __iter__(self):
+        """
+        Yields one tuple per activity in `fields` order, ready for cursor.executemany
+        """
+        return iter(zip(*[self.column_values(field) for field in self.fields]))
+
+    def total(self, field):
+        return float(np.nansum(self.data[field]))
+
+    def first_date(self):
+        return self.data['_date'].min().item() if len(self) else None
+
+    def last_date(self):
+        return self.data['_date'].max().item() if len(self) else None
@@ -0,0 +1,54 @@
+"""
+Ingestion throughput benchmark against the local Strava stand-in.
+
+Starts strava_standin in process, fetches and transforms every synthetic activity through StravaConnector, and
+optionally loads them into Postgres. Faults and latency are configured like the stand-in itself.
+
+    $ python benchmarks/ingest.py --activities 100000 --latency-ms 20
+    $ python benchmarks/ingest.py --activities 10000 --load
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import strava_standin
+from data_fetcher import StravaConnector, DBConnection, UPDATE_FIELDS
+
+
+def main():
+    parser = strava_standin.build_parser()
+    parser.description = __doc__
+    parser.set_defaults(port=0)
+    parser.add_argument('--load', action='store_true', default=False, help="Also load the activities into Postgres")
+    parser.add_argument('--config', default='config.conf')
+    parser.add_argument('--section', default='local')
+    args = parser.parse_args()
+
+    server = strava_standin.build_server(args)
+    server.start_in_background()
+    connector = StravaConnector(token='benchmark', base_url=server.api_url)
+
+    started = time.time()
+    try:
+        activities = connector.get_activities()
+    except Exception as e:
+        print "Fetch failed after {seconds:.1f}s: {error}".format(seconds=time.time() - started, error=e)
+        return 1
+    fetched = time.time() - started
+    print "fetched {count:,} activities in {seconds:.1f}s ({rate:,.0f} activities/s, {requests:,} requests)".format(
+        count=len(activities), seconds=fetched, rate=len(activities) / fetched,
+        requests=server.faults.long_usage)
+
+    if args.load:
+        started = time.time()
+        DBConnection(args.config, args.section).insert_data(data=activities, update_fields=UPDATE_FIELDS)
+        loaded = time.time() - started
+        print "loaded in {seconds:.1f}s ({rate:,.0f} activities/s)".format(seconds=loaded,
+                                                                            rate=len(activities) / loaded)
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
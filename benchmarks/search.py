@@ -0,0 +1,94 @@
+"""
+Search benchmark for activity names: a sequential ILIKE scan against the GIN indexed tsvector used by ?search=.
+
+Builds a table of synthetic activity names, then prints the EXPLAIN ANALYZE plan and best time of each query. Needs the
+Postgres database from config.conf.
+
+    $ python benchmarks/search.py --rows 1000000 --search "ride london"
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import psycopg2
+from data_fetcher import DBConnection
+from strava.search import VECTOR_SQL, MATCH_SQL, RANK_SQL
+
+TABLE = 'strava_benchmark_search'
+WORDS = ['Morning', 'Afternoon', 'Evening', 'Ride', 'London', 'Sportive', 'Richmond', 'Park', 'Laps', 'Commute',
+         'Box', 'Hill', 'Surrey', 'Hills', 'Recovery', 'Spin', 'Chaingang', 'Club', 'Run', 'Prudential']
+
+FILL_SQL = """
+    insert into {table} (activity_id, name)
+    select i, (%(words)s)[1 + (i * 7) %% %(count)s] || ' ' || (%(words)s)[1 + (i * 13) %% %(count)s] || ' ' ||
+              (%(words)s)[1 + (i * 31) %% %(count)s]
+    from generate_series(1, %(rows)s) as i
+"""
+
+QUERIES = {
+    'ilike': "select activity_id, name from {table} where name ilike %s",
+    'tsvector': "select activity_id, name, {rank} as search_rank from {table} where {match} "
+                "order by search_rank desc".format(table='{table}', rank=RANK_SQL, match=MATCH_SQL),
+}
+
+
+def build_table(cursor, rows):
+    cursor.execute("drop table if exists {table}".format(table=TABLE))
+    cursor.execute("create table {table} (activity_id integer primary key, name text not null, "
+                   "name_search tsvector)".format(table=TABLE))
+    cursor.execute(FILL_SQL.format(table=TABLE), {'words': WORDS, 'count': len(WORDS), 'rows': rows})
+    cursor.execute("update {table} set name_search = {vector}".format(table=TABLE, vector=VECTOR_SQL % 'name'))
+    cursor.execute("create index on {table} using gin (name_search)".format(table=TABLE))
+    cursor.execute("vacuum analyze {table}".format(table=TABLE))
+
+
+def query_params(name, text):
+    if name == 'ilike':
+        return ['%' + '%'.join(text.split()) + '%']
+    return [text, text]
+
+
+def time_query(cursor, sql, params, runs):
+    timings = []
+    for _ in range(runs):
+        started = time.time()
+        cursor.execute(sql, params)
+        cursor.fetchall()
+        timings.append(time.time() - started)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--search', default='ride london')
+    parser.add_argument('--config', default='config.conf')
+    parser.add_argument('--section', default='local')
+    parser.add_argument('--keep', action='store_true', help="Don't drop the benchmark table afterwards")
+    args = parser.parse_args()
+
+    conn = psycopg2.connect(**DBConnection(args.config, args.section).get_config_details())
+    conn.autocommit = True
+    cursor = conn.cursor()
+    build_table(cursor, args.rows)
+
+    for name in sorted(QUERIES):
+        sql = QUERIES[name].format(table=TABLE)
+        params = query_params(name, args.search)
+        cursor.execute("explain analyze " + sql, params)
+        print "== {name} ==".format(name=name)
+        print "\n".join(line for line, in cursor.fetchall())
+        best = time_query(cursor, sql, params, args.runs)
+        print "best of {runs}: {ms:.1f} ms\n".format(runs=args.runs, ms=best * 1000)
+
+    if not args.keep:
+        cursor.execute("drop table {table}".format(table=TABLE))
+    conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+"""
+Load test of the activity listing: the Django / DRF StravaView against the read-only API (strava/readonly.py).
+
+Serves both apps from threaded WSGI servers in this process (or uses --django-url / --readonly-url for servers you
+run yourself, e.g. under gunicorn, which avoids sharing a GIL with the load generator), then has --concurrency
+clients request the first page --requests times each and reports requests/sec and latency percentiles. Needs the
+Postgres database from settings.py with the activity table loaded.
+
+    $ python benchmarks/serving.py --concurrency 8 --requests 500
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+from SocketServer import ThreadingMixIn
+from wsgiref.simple_server import WSGIServer, WSGIRequestHandler, make_server
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import requests
+from datawarehouse import setup_django
+
+TOKEN = 'benchmark'
+USERNAME = 'serving-benchmark'
+
+
+class ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(application):
+    server = make_server('127.0.0.1', 0, application, server_class=ThreadingWSGIServer, handler_class=QuietHandler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    return server, 'http://127.0.0.1:{port}'.format(port=server.server_port)
+
+
+def admin_session_cookie():
+    """
+    :return: session cookie for a staff user, as StravaView only serves admins
+    """
+    from django.contrib.auth.models import User
+    from django.test import Client
+    user, _ = User.objects.get_or_create(username=USERNAME, defaults={'is_staff': True})
+    client = Client()
+    client.force_login(user)
+    return {'sessionid': client.cookies['sessionid'].value}
+
+
+def load(url, concurrency, requests_per_client, headers=None, cookies=None):
+    """
+    :return: tuple of (seconds taken, array of each request's latency in seconds)
+    """
+    latencies = [[] for _ in range(concurrency)]
+    failures = []
+
+    def client(timings):
+        session = requests.Session()
+        for _ in range(requests_per_client):
+            started = time.time()
+            response = session.get(url, headers=headers, cookies=cookies)
+            timings.append(time.time() - started)
+            if response.status_code != 200:
+                failures.append(response.status_code)
+
+    threads = [threading.Thread(target=client, args=(timings,)) for timings in latencies]
+    started = time.time()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if failures:
+        raise RuntimeError("{count} requests to {url} failed, e.g. with HTTP {status}".format(
+            count=len(failures), url=url, status=failures[0]))
+    return time.time() - started, np.concatenate([np.array(timings) for timings in latencies])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=200, help="Requests made by each client")
+    parser.add_argument('--django-url', help="Root of an already running datawarehouse.wsgi server")
+    parser.add_argument('--readonly-url', help="Root of an already running datawarehouse.readonly_wsgi server")
+    parser.add_argument('--token', default=TOKEN, help="Token accepted by the read-only server")
+    args = parser.parse_args()
+
+    setup_django()
+    from django.core.wsgi import get_wsgi_application
+    from strava.readonly import ReadOnlyAPI
+
+    django_url = args.django_url or serve(get_wsgi_application())[1]
+    readonly_url = args.readonly_url or serve(ReadOnlyAPI(tokens=[args.token]))[1]
+    targets = [('StravaView', django_url.rstrip('/') + '/strava/', {}, admin_session_cookie()),
+               ('read-only', readonly_url.rstrip('/') + '/activities/',
+                {'Authorization': 'Token ' + args.token}, None)]
+
+    print "{:<12}{:>10}{:>10}{:>10}{:>10}".format('app', 'req/s', 'p50 ms', 'p99 ms', 'max ms')
+    for name, url, headers, cookies in targets:
+        load(url, 1, 5, headers, cookies)  # warm up connections and prepared statements
+        seconds, latencies = load(url, args.concurrency, args.requests, headers, cookies)
+        print "{:<12}{:>10.0f}{:>10.1f}{:>10.1f}{:>10.1f}".format(
+            name, len(latencies) / seconds, np.percentile(latencies, 50) * 1000,
+            np.percentile(latencies, 99) * 1000, latencies.max() * 1000)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+"""
+Startup time benchmark for the CLI.
+
+Times `cli.py --help` and the bare imports of our modules in fresh interpreters, and checks which heavy modules each
+one drags in. On Python 3.7+ the slowest imports are also listed using `-X importtime`.
+
+    $ python benchmarks/startup.py
+"""
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ['django', 'stravalib', 'psycopg2', 'requests', 'numpy', 'matplotlib']
+RUNS = 10
+
+COMMANDS = [
+    ('cli.py --help', ['cli.py', '--help']),
+    ('import cli', ['-c', 'import cli']),
+    ('import weather', ['-c', 'import weather']),
+    ('import data_fetcher', ['-c', 'import data_fetcher']),
+]
+
+
+def time_command(args, runs=RUNS):
+    timings = []
+    with open(os.devnull, 'w') as devnull:
+        for _ in range(runs):
+            started = time.time()
+            subprocess.check_call([sys.executable] + args, cwd=ROOT, stdout=devnull, stderr=devnull)
+            timings.append(time.time() - started)
+    return sorted(timings)[len(timings) // 2]
+
+
+def heavy_modules_loaded(module):
+    code = "import sys, {module}; print(','.join(m for m in {heavy!r} if m in sys.modules))".format(
+        module=module, heavy=HEAVY_MODULES)
+    return subprocess.check_output([sys.executable, '-c', code], cwd=ROOT).decode().strip()
+
+
+def slowest_imports(args, top=10):
+    if sys.version_info < (3, 7):
+        return []
+    output = subprocess.Popen([sys.executable, '-X', 'importtime'] + args, cwd=ROOT,
+                              stdout=subprocess.PIPE, stderr=subprocess.PIPE).communicate()[1].decode()
+    rows = []
+    for line in output.splitlines()[1:]:
+        self_us, cumulative_us, name = [part.strip() for part in line.split(':', 1)[1].split('|')]
+        rows.append((int(cumulative_us), name))
+    return sorted(rows, reverse=True)[:top]
+
+
+if __name__ == '__main__':
+    print("{:<22}{:>12}".format('command', 'median ms'))
+    for label, args in COMMANDS:
+        print("{:<22}{:>12.1f}".format(label, time_command(args) * 1000))
+    print("")
+    for module in ('cli', 'weather', 'data_fetcher'):
+        print("import {module} loads: {loaded}".format(module=module, loaded=heavy_modules_loaded(module) or '-'))
+    for cumulative_us, name in slowest_imports(['cli.py', '--help']):
+        print("{:>10}us {}".format(cumulative_us, name))
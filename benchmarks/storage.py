@@ -0,0 +1,106 @@
+"""
+Storage benchmark for the Strava table: schema v1 (numeric / text columns) against schema v2 (native types).
+
+Builds both versions of the table side by side from the same synthetic rows, then reports table and index sizes and
+the time taken by a typical yearly aggregate. Needs the Postgres database from config.conf.
+
+    $ python benchmarks/storage.py --rows 1000000
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import psycopg2
+from data_fetcher import DBConnection
+
+SCHEMAS = {
+    'v1': """
+        activity_id integer primary key, name text not null, _date date not null,
+        distance_miles numeric(10, 4), avg_power numeric(10, 4),
+        moving_time_seconds numeric(18, 4), elapsed_time_seconds numeric(18, 4),
+        kudos_count integer, elevation_feet numeric(18, 4), kilojoules numeric(10, 4),
+        country text, city text, latitude double precision, longitude text,
+        is_stationary_trainer boolean not null, photo_count integer not null""",
+    'v2': """
+        activity_id integer primary key, name text not null, _date date not null,
+        distance_miles double precision, avg_power double precision,
+        moving_time_seconds integer, elapsed_time_seconds integer,
+        kudos_count smallint, elevation_feet double precision, kilojoules double precision,
+        country text, city text, latitude double precision, longitude double precision,
+        is_stationary_trainer boolean not null, photo_count smallint not null""",
+}
+
+FILL_SQL = """
+    insert into {table}
+    select i, 'Ride ' || i, date '2010-01-01' + (i % 3000),
+           random() * 100, random() * 300, (random() * 20000)::int, (random() * 25000)::int,
+           (random() * 50)::int, random() * 5000, random() * 3000,
+           'United Kingdom', 'London', 51 + random(), {longitude}, random() < 0.2, (random() * 5)::int
+    from generate_series(1, %s) as i
+"""
+
+AGGREGATE_SQL = """
+    select extract(year from _date), count(*), sum(distance_miles), avg(avg_power), sum(moving_time_seconds),
+           sum(elevation_feet), sum(kilojoules)
+    from {table}
+    group by 1
+"""
+
+
+def build_table(cursor, version, rows):
+    table = 'strava_benchmark_' + version
+    cursor.execute("drop table if exists {table}".format(table=table))
+    cursor.execute("create table {table} ({schema})".format(table=table, schema=SCHEMAS[version]))
+    longitude = "(-1 + random())::text" if version == 'v1' else "-1 + random()"
+    cursor.execute(FILL_SQL.format(table=table, longitude=longitude), (rows,))
+    cursor.execute("create index on {table} (_date)".format(table=table))
+    if version == 'v2':
+        cursor.execute("create index on {table} (latitude, longitude)".format(table=table))
+    cursor.execute("vacuum analyze {table}".format(table=table))
+    return table
+
+
+def sizes(cursor, table):
+    cursor.execute("select pg_table_size(%s), pg_indexes_size(%s)", (table, table))
+    return cursor.fetchone()
+
+
+def time_query(cursor, sql, runs):
+    timings = []
+    for _ in range(runs):
+        started = time.time()
+        cursor.execute(sql)
+        cursor.fetchall()
+        timings.append(time.time() - started)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--config', default='config.conf')
+    parser.add_argument('--section', default='local')
+    parser.add_argument('--keep', action='store_true', help="Don't drop the benchmark tables afterwards")
+    args = parser.parse_args()
+
+    conn = psycopg2.connect(**DBConnection(args.config, args.section).get_config_details())
+    conn.autocommit = True
+    cursor = conn.cursor()
+
+    print "{:<6}{:>14}{:>14}{:>16}".format('schema', 'table MB', 'indexes MB', 'aggregate ms')
+    for version in sorted(SCHEMAS):
+        table = build_table(cursor, version, args.rows)
+        table_size, index_size = sizes(cursor, table)
+        aggregate = time_query(cursor, AGGREGATE_SQL.format(table=table), args.runs)
+        print "{:<6}{:>14.1f}{:>14.1f}{:>16.1f}".format(version, table_size / 1e6, index_size / 1e6, aggregate * 1000)
+        if not args.keep:
+            cursor.execute("drop table {table}".format(table=table))
+    conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,142 @@
+import collections
+import contextlib
+import fcntl
+import shelve
+import threading
+import time
+
+DEFAULT_TTL = 10 * 60
+DEFAULT_STALE_TTL = 60 * 60
+DEFAULT_MAX_SIZE = 256
+
+
+class TTLCache(object):
+
+    """
+    In memory LRU cache with a time to live, optionally backed by a shelve file on disk so entries survive between
+    processes. Entries older than `ttl` but younger than `stale_ttl` are served straight away while a background thread
+    refreshes them (stale-while-revalidate). Short lived callers, which would exit before a background refresh finished,
+    should pass background=False so stale entries are refreshed before they return.
+    """
+
+    def __init__(self, ttl=DEFAULT_TTL, stale_ttl=DEFAULT_STALE_TTL, max_size=DEFAULT_MAX_SIZE, path=None,
+                 background=True):
+        """
+        :param ttl: seconds an entry is fresh for
+        :param stale_ttl: seconds an entry may be served while it is being refreshed
+        :param max_size: maximum number of entries kept in memory
+        :param path: shelve file to persist entries to, or None for memory only
+        :param background: refresh stale entries on a background thread rather than in the caller
+        """
+        self.ttl = ttl
+        self.stale_ttl = max(stale_ttl, ttl)
+        self.max_size = max_size
+        self.path = path
+        self.background = background
+        self.memory = collections.OrderedDict()
+        self.refreshing = set()
+        self.lock = threading.RLock()
+
+    @contextlib.contextmanager
+    def _open_disk(self, exclusive):
+        """
+        Opens the shelve under a file lock, so other processes (e.g. the cron sync and a manual CLI run) never read it
+        half written or write it at the same time
+        """
+        with open(self.path + '.lock', 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                store = shelve.open(self.path)
+                try:
+                    yield store
+                finally:
+                    store.close()
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _read_disk(self, key):
+        if not self.path:
+            return None
+        with self._open_disk(exclusive=False) as store:
+            return store.get(key)
+
+    def _write_disk(self, key, entry):
+        if not self.path:
+            return
+        with self._open_disk(exclusive=True) as store:
+            store[key] = entry
+
+    def _remember(self, key, entry):
+        self.memory.pop(key, None)
+        self.memory[key] = entry
+        while len(self.memory) > self.max_size:
+            self.memory.popitem(last=False)
+
+    def get_entry(self, key):
+        """
+        :return: (stored_at, value) tuple, or None if we have nothing for this key
+        """
+        key = str(key)
+        with self.lock:
+            entry = self.memory.get(key)
+            if entry is None:
+                entry = self._read_disk(key)
+                if entry is None:
+                    return None
+            self._remember(key, entry)
+            return entry
+
+    def age(self, entry):
+        return time.time() - entry[0]
+
+    def get(self, key):
+        """
+        :return: the cached value if it is still fresh, otherwise None
+        """
+        entry = self.get_entry(key)
+        if entry is not None and self.age(entry) < self.ttl:
+            return entry[1]
+
+    def set(self, key, value):
+        key = str(key)
+        entry = (time.time(), value)
+        with self.lock:
+            self._remember(key, entry)
+            self._write_disk(key, entry)
+        return value
+
+    def refresh(self, key, fetch):
+        try:
+            self.set(key, fetch())
+        except Exception as e:
+            print "Background refresh of {key} failed: {error}".format(key=key, error=e)
+        finally:
+            with self.lock:
+                self.refreshing.discard(str(key))
+
+    def refresh_in_background(self, key, fetch):
+        with self.lock:
+            if str(key) in self.refreshing:
+                return None
+            self.refreshing.add(str(key))
+        thread = threading.Thread(target=self.refresh, args=(key, fetch))
+        thread.daemon = True
+        thread.start()
+        return thread
+
+    def get_or_fetch(self, key, fetch):
+        """
+        Returns the cached value for key, calling fetch() only when we have nothing usable
+        :param key: cache key
+        :param fetch: callable which gets a new value
+        :return: value
+        """
+        entry = self.get_entry(key)
+        if entry is not None:
+            age = self.age(entry)
+            if age < self.ttl:
+                return entry[1]
+            if age < self.stale_ttl and self.background:
+                self.refresh_in_background(key, fetch)
+                return entry[1]
+        return self.set(key, fetch())
@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+"""
+Single entry point for the strava-data scripts.
+
+Only argparse is imported up front. Django, stravalib, psycopg2 and requests are imported inside the subcommands
+which need them, so `--help` and the lighter commands start quickly.
+"""
+import argparse
+import sys
+
+
+def run_sync(args):
+    from activities import ActivityBatch
+    from data_fetcher import StravaConnector, DBConnection, UPDATE_FIELDS, summary_printout
+    from strava.profiling import Profiler
+    profiler = Profiler(args.profile, run_name='sync')
+    strava = StravaConnector()
+    with profiler.stage('fetch'):
+        rides = strava.fetch_activities()
+    with profiler.stage('transform'):
+        activities = ActivityBatch.from_activities(rides)
+    with profiler.stage('load'):
+        DBConnection(args.config, args.section).insert_data(data=activities, update_fields=UPDATE_FIELDS)
+    print summary_printout(user_details=strava.get_details(), activity_list=activities)
+    print "{calls} Strava API calls".format(calls=strava.take_call_count())
+    if profiler.enabled:
+        print profiler.report()
+
+
+def run_summary(args):
+    from data_fetcher import StravaConnector, summary_printout
+    strava = StravaConnector()
+    print summary_printout(user_details=strava.get_details(), activity_list=strava.get_activities())
+
+
+def run_weather(args):
+    from weather import Weather, default_cache
+    # we exit straight after printing, which would kill a background refresh part way through writing the cache
+    cache = None if args.no_cache else default_cache(background=False)
+    weather_dict = Weather(city_id=args.city_id, use_default=args.city_id is None, cache=cache).build_weather_dict()
+    for key in sorted(weather_dict):
+        print "{key}: {value}".format(key=key, value=weather_dict[key])
+
+
+def run_export(args):
+    import csv
+    from datawarehouse import setup_django
+    setup_django()
+    from strava.models import Strava
+
+    # the model's own columns, less the search vector and change marker which only ingestion uses
+    fields = [field.name for field in Strava._meta.concrete_fields if field.editable]
+    output = open(args.output, 'wb') if args.output else sys.stdout
+    try:
+        writer = csv.writer(output)
+        writer.writerow(fields)
+        for row in Strava.objects.order_by('_date').values_list(*fields).iterator():
+            writer.writerow([value.encode('utf-8') if isinstance(value, unicode) else value for value in row])
+    finally:
+        if args.output:
+            output.close()
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Fetch, summarise and export your Strava data")
+    subparsers = parser.add_subparsers(title='commands')
+
+    sync = subparsers.add_parser('sync', help="Fetch all activities from Strava and load them into Postgres")
+    sync.add_argument('--config', default='config.conf', help="DB config file")
+    sync.add_argument('--section', default='local', help="Section of the DB config file")
+    sync.add_argument('--profile', metavar='DIR',
+                      help="Write cProfile and collapsed stack profiles of each stage of the sync to DIR")
+    sync.set_defaults(func=run_sync)
+
+    summary = subparsers.add_parser('summary', help="Print your lifetime stats straight from the Strava API")
+    summary.set_defaults(func=run_summary)
+
+    weather = subparsers.add_parser('weather', help="Print the current weather for a city (London by default)")
+    weather.add_argument('--city-id', type=int, help="OpenWeatherMap city id")
+    weather.add_argument('--no-cache', action='store_true', default=False, help="Always call the weather API")
+    weather.set_defaults(func=run_weather)
+
+    export = subparsers.add_parser('export', help="Export the activity table as CSV")
+    export.add_argument('--output', help="File to write to (defaults to stdout)")
+    export.set_defaults(func=run_export)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,132 +1,199 @@
 # -*- coding: utf-8 -*-
 from stravalib import Client
+from stravalib.protocol import ApiV3
 import psycopg2
+import requests
+from requests.adapters import HTTPAdapter
 from ConfigParser import SafeConfigParser
 import warnings
-import django
+import datetime
 import os
-os.environ.setdefault("DJANGO_SETTINGS_MODULE", "datawarehouse.settings")
-django.setup()
-from strava.models import Strava
+import time
+from datawarehouse import setup_django
 from datawarehouse.settings import APP_NAME
+from activities import ActivityBatch
+from strava.records import METRICS, TOP_N, ALL_TIME, Leaderboard
+from strava.search import SEARCH_FIELD, VECTOR_SQL
+from strava.training_load import daily_loads, training_load
+
+UPDATE_FIELDS = ['kudos_count', 'photo_count', 'name', 'latitude', 'longitude', 'geohash',
+                 'summary_polyline', 'polyline_medium', 'polyline_low']
+MODEL_NAME = 'strava'
+# change marker written by the database clock when a row is inserted or changed, used by incremental exports
+CHANGED_FIELD = 'updated_at'
+# how long the athlete profile is trusted before it is fetched again, so a long running daemon still sees changes
+ATHLETE_TTL = 60 * 60
+POOL_SIZE = 4
+
+
+def get_model(model_name='Strava'):
+    """
+    Django is only set up the first time we actually need a model, so importing this module stays cheap
+    :param model_name: name of a model in the strava app
+    :return: the model class
+    """
+    setup_django()
+    from django.apps import apps
+    return apps.get_model(APP_NAME, model_name)
+
+
+class RedirectedApiV3(ApiV3):
+
+    """
+    stravalib protocol which sends requests to another server, e.g. the local stand-in in strava_standin.py
+    """
+
+    def __init__(self, base_url, **kwargs):
+        """
+        :param base_url: API root to use instead of https://www.strava.com/api/v3
+        """
+        super(RedirectedApiV3, self).__init__(**kwargs)
+        self.base_url = base_url.rstrip('/')
+
+    def _resolve_url(self, url, use_webhook_server):
+        if not url.startswith('http'):
+            url = self.base_url + '/' + url.strip('/')
+        return url
 
 
 class StravaConnector(object):
 
     """
-    Class for connecting to the Strava API given a public access token
+    Class for connecting to the Strava API given a public access token. One authenticated client, on one keep-alive
+    HTTP session, is shared by everything the connector does until reset() is called.
     """
 
-    def __init__(self):
+    def __init__(self, token=None, interactive=True, base_url=None, athlete_ttl=ATHLETE_TTL):
         """
         Instantiate the class by entering your access token
+        :param token: access token to use instead of the environment / prompt
+        :param interactive: whether we are allowed to prompt for a missing token
+        :param base_url: API root to use instead of Strava's (defaults to STRAVA_API_URL if it is set)
+        :param athlete_ttl: seconds the athlete profile is reused for before it is fetched again
         """
-        self.token = self.get_access_token()
-        self.tablename = APP_NAME + Strava.__name__.lower()
+        self.token = token or self.get_access_token(interactive=interactive)
+        self.base_url = base_url or os.environ.get('STRAVA_API_URL')
+        self.tablename = APP_NAME + MODEL_NAME
+        self.athlete_ttl = athlete_ttl
+        self.api_calls = 0
+        self._client = None
+        self._athlete = None
+        self._athlete_fetched = None
 
     @staticmethod
-    def get_access_token():
+    def get_access_token(interactive=True):
         token = os.environ.get('STRAVA_ACCESS_TOKEN')
         if token:
             return token
-        else:
+        elif interactive:
             return raw_input("Please enter your token here:")
+        raise ValueError("No Strava access token found. Set STRAVA_ACCESS_TOKEN to run non-interactively")
+
+    def count_call(self, response, *args, **kwargs):
+        self.api_calls += 1
+
+    def build_session(self):
+        """
+        :return: requests session which keeps its connections alive between calls, asks for compressed responses and
+        counts every call it makes
+        """
+        session = requests.Session()
+        session.headers['Accept-Encoding'] = 'gzip, deflate'
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        session.hooks['response'].append(self.count_call)
+        return session
 
     def get_connection(self):
         """
-        Method to connect to the Strava API given a access token
+        Method to connect to the Strava API given a access token. The first call checks the token by fetching the
+        athlete profile, which is kept for get_athlete; later calls return the same client.
         :return: connection
         """
-        conn = Client(access_token=self.token)
+        if self._client is not None:
+            return self._client
+        session = self.build_session()
+        if self.base_url:
+            # the stand-in server enforces its own rate limits, so we don't throttle ourselves as well
+            conn = Client(access_token=self.token, rate_limit_requests=False, requests_session=session)
+            conn.protocol = RedirectedApiV3(base_url=self.base_url, access_token=self.token,
+                                            requests_session=session)
+        else:
+            conn = Client(access_token=self.token, requests_session=session)
         try:
-            conn.protocol.get('/athlete')
+            self.remember_athlete(conn.get_athlete())
         except Exception as e:
             print "Authorisation Error: {error}".format(error=e)
+            session.close()
             raise e
+        self._client = conn
         return conn
 
-    def get_details(self):
+    def reset(self):
         """
-        Method which confirms the athlete is actually you.
-        :return: dict with your first name, surname and how many followers you have on Strava
+        Drops the client and its session, e.g. after a failed sync, so the next call connects from scratch
         """
-        conn = self.get_connection()
-        athlete = conn.get_athlete()
-        return {
-            'first_name': athlete.firstname,
-            'last_name': athlete.lastname,
-            'followers': athlete.follower_count
-        }
+        if self._client is not None:
+            self._client.protocol.rsession.close()
+        self._client = None
+        self._athlete = None
 
-    @staticmethod
-    def distance_converter(qnty_obj):
+    def take_call_count(self):
         """
-        Method which converts from metres to miles seeing as we live in the UK. We DON'T TALK IN KM's!!!
-        :param qnty_obj: units.quantity.Quantity instance
-        :return: distance cycled in miles
+        :return: number of API calls made since the last time this was called
         """
-        metres = qnty_obj.get_num()
-        return metres * 0.000621371
+        calls, self.api_calls = self.api_calls, 0
+        return calls
 
-    @staticmethod
-    def real_watts(flag, watts):
+    def remember_athlete(self, athlete):
+        self._athlete = athlete
+        self._athlete_fetched = time.time()
+
+    def get_athlete(self):
         """
-        Method which checks whether the watts which are shown are "estimated" or from a actual powermeter.
-        If the watts are from a powermeter, show the average power, otherwise get rid of it as it's garbage data
-        :param flag: boolean flag
-        :param watts: average power
-        :return: average watts for activity
+        :return: the authenticated athlete, only fetched again once it is older than athlete_ttl
         """
-        if flag is True:
-            return watts
+        conn = self.get_connection()
+        if self._athlete is None or time.time() - self._athlete_fetched > self.athlete_ttl:
+            self.remember_athlete(conn.get_athlete())
+        return self._athlete
 
-    @staticmethod
-    def time_in_seconds(timedelta):
+    def get_details(self):
         """
-        method which takes in a timedelta object and converts it to seconds
-        :param timedelta: timedelta object
-        :returns: time of ride in seconds
+        Method which confirms the athlete is actually you.
+        :return: dict with your first name, surname and how many followers you have on Strava
         """
-        return timedelta.total_seconds()
+        athlete = self.get_athlete()
+        return {
+            'first_name': athlete.firstname,
+            'last_name': athlete.lastname,
+            'followers': athlete.follower_count
+        }
 
-    @staticmethod
-    def metres_to_feet(qnty_obj):
+    def fetch_activities(self, after=None, conn=None):
         """
-        Method which converts from metres into feet.
-        :param qnty_obj: units.quantity.Quantity instance
-        :return: elevation climbed in feet
+        :param after: only fetch activities which started after this datetime (incremental sync)
+        :param conn: an already authenticated connection to use instead of the connector's own
+        :return: list of stravalib Activity objects
         """
-        metres = qnty_obj.get_num()
-        return metres * 3.28084
+        conn = conn or self.get_connection()
+        rides = []
+        for activity in conn.get_activities(after=after):
+            rides.append(activity)
+            if len(rides) % 100 == 0:
+                print "{rows} rides fetched so far...".format(rows=len(rides))
+        return rides
 
-    def get_activities(self):
+    def get_activities(self, after=None, conn=None):
         """
         Main method which gets all historic ride data and transforms it accordingly so that we can insert the data
         into our a Postgres table to easily query
+        :param after: only fetch activities which started after this datetime (incremental sync)
+        :param conn: an already authenticated connection to use instead of the connector's own
+        :return: ActivityBatch
         """
-        ride_info = []
-        conn = self.get_connection()
-        activities = conn.get_activities()
-        for activity in activities:
-            ride_info.append((activity.id,
-                              activity.name,
-                              activity.start_date.strftime('%Y-%m-%d'),
-                              self.distance_converter(activity.distance),
-                              self.real_watts(activity.device_watts, activity.average_watts),
-                              self.time_in_seconds(activity.moving_time),
-                              self.time_in_seconds(activity.elapsed_time),
-                              activity.kudos_count,
-                              self.metres_to_feet(activity.total_elevation_gain),
-                              activity.kilojoules,
-                              activity.location_country,
-                              activity.location_city,
-                              activity.start_longitude,
-                              activity.start_latitude,
-                              activity.trainer,
-                              activity.total_photo_count))
-            if len(ride_info) % 100 == 0:
-                print "{rows} rides processed so far...".format(rows=len(ride_info))
-        return ride_info
+        return ActivityBatch.from_activities(self.fetch_activities(after=after, conn=conn))
 
 
 class DBConnection(object):
@@ -134,16 +201,21 @@ class DBConnection(object):
     Class for getting DB Connections
     """
 
-    def __init__(self, config, section):
+    def __init__(self, config, section, persistent=False):
         """
         Initialise the class by reading a config file and config section
         :param config: config file to read from
         :param section: section of config file
+        :param persistent: keep a single connection open and reuse it between calls
         """
         self.config = config
         self.section = section
+        self.persistent = persistent
+        self._conn = None
         warnings.filterwarnings("ignore")
-        self.table = APP_NAME + '_' + Strava.__name__.lower()
+        self.table = APP_NAME + '_' + get_model().__name__.lower()
+        self.training_load_table = APP_NAME + '_' + get_model('TrainingLoad').__name__.lower()
+        self.records_table = APP_NAME + '_' + get_model('PersonalRecord').__name__.lower()
 
     def get_config_details(self):
         """
@@ -159,7 +231,19 @@ class DBConnection(object):
         Method for getting a connection
         :returns: DB Connection
         """
-        return psycopg2.connect(**self.get_config_details())
+        if not self.persistent:
+            return psycopg2.connect(**self.get_config_details())
+        if self._conn is None or self._conn.closed:
+            self._conn = psycopg2.connect(**self.get_config_details())
+        return self._conn
+
+    def close(self):
+        """
+        Closes the persistent connection, if we have one
+        """
+        if self._conn is not None and not self._conn.closed:
+            self._conn.close()
+        self._conn = None
 
     def execute_sql(self, sql, data=None, executemany=False):
         with self.connect() as conn:
@@ -172,9 +256,25 @@ class DBConnection(object):
                 cursor.execute(sql)
                 return cursor.rowcount
 
+    def fetch_all(self, sql, data=None):
+        """
+        Runs a query and returns all of the rows it produced
+        """
+        with self.connect() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(sql, data)
+                return cursor.fetchall()
+
+    def get_latest_activity_date(self):
+        """
+        :return: date of the most recent activity we have stored, or None if the table is empty
+        """
+        return self.fetch_all("select max(_date) from {table_name}".format(table_name=self.table))[0][0]
+
     @staticmethod
     def get_field_names(model):
-        return [fields.name for fields in model._meta.get_fields()]
+        # only the model's own columns, not reverse relations such as PersonalRecord.activity
+        return [field.column for field in model._meta.concrete_fields]
 
     @staticmethod
     def get_placement_holders(fields):
@@ -182,42 +282,153 @@ class DBConnection(object):
 
     def insert_data(self, data, update_fields):
         """
-        Method which inserts our data
+        Method which inserts our data. The name's search vector is written by the same statement, from a second copy of
+        the name in each row, so it can never fall behind the name. Rows are stamped with CHANGED_FIELD when inserted,
+        and when updated only if one of the update fields really changed, so re-fetching unchanged activities doesn't
+        make them look new to the snapshot export. The stamp is clock_timestamp() rather than now(), which is the start
+        of the transaction.
+        :param data: ActivityBatch, or rows in the same order as the model fields
+        :param update_fields: fields to update when the activity already exists
         """
-        fields = self.get_field_names(model=Strava)
+        fields = [field for field in getattr(data, 'fields', None) or self.get_field_names(model=get_model())
+                  if field not in (SEARCH_FIELD, CHANGED_FIELD)]
+        compared = [field for field in update_fields if field not in (SEARCH_FIELD, CHANGED_FIELD)]
         holders = self.get_placement_holders(fields)
+        values = data
+        update_fields = list(compared)
+        if 'name' in fields:
+            name = fields.index('name')
+            values = (tuple(row) + (row[name],) for row in data)
+            fields = fields + [SEARCH_FIELD]
+            holders = holders + "," + VECTOR_SQL
+            if 'name' in update_fields:
+                update_fields = update_fields + [SEARCH_FIELD]
+        fields = fields + [CHANGED_FIELD]
+        holders = holders + ",clock_timestamp()"
+        update_fields = update_fields + [CHANGED_FIELD]
         fields_to_update = ", ".join("{field}=excluded.{field}".format(field=field) for field in update_fields)
         sql = "insert into {table_name} ({fields}) " \
-              "values ({holders}) on conflict (activity_id) do update set {update_columns}".format(
-            table_name=self.table, fields=",".join(fields), holders=holders, update_columns=fields_to_update
+              "values ({holders}) on conflict (activity_id) do update set {update_columns} " \
+              "where ({current}) is distinct from ({new})".format(
+            table_name=self.table, fields=",".join(fields), holders=holders, update_columns=fields_to_update,
+            current=", ".join("{table}.{field}".format(table=self.table, field=field) for field in compared),
+            new=", ".join("excluded.{field}".format(field=field) for field in compared)
         )
-        rows = self.execute_sql(sql=sql, data=data, executemany=True)
+        rows = self.execute_sql(sql=sql, data=values, executemany=True)
         print "{rows} rows inserted!".format(rows=rows)
+        if isinstance(data, ActivityBatch) and len(data):
+            self.update_training_load(since=data.first_date())
+            self.update_records(activity_ids=data['activity_id'].tolist())
+        return rows
 
+    def update_training_load(self, since):
+        """
+        Recalculates the daily training load table from `since` up to today. Fitness and fatigue carry on from the last
+        day we already have before `since`, so only the days after it are recalculated.
+        :param since: earliest date whose activities have changed
+        :return: number of days written
+        """
+        seed = self.fetch_all("select date, ctl, atl from {table_name} where date < %s order by date desc limit 1"
+                              .format(table_name=self.training_load_table), (since,))
+        if seed:
+            last_day, ctl, atl = seed[0]
+            start = last_day + datetime.timedelta(days=1)
+        else:
+            ctl = atl = 0.0
+            start = self.fetch_all("select min(_date) from {table_name}".format(table_name=self.table))[0][0]
+            if start is None:
+                return 0
 
-def calculate_list_index(index, activity_list, calc=sum):
-    """
-    :param index:
-    :param activity_list:
-    :param calc:
-    :return: calculation for a given index in a list
-    """
-    return calc(activity[index] for activity in activity_list if activity[index] is not None)
+        activity_loads = self.fetch_all("select _date, sum(kilojoules) from {table_name} where _date >= %s "
+                                        "group by _date".format(table_name=self.table), (start,))
+        end = max([datetime.date.today()] + [day for day, _ in activity_loads])
+        days, loads = daily_loads(dates=[day for day, _ in activity_loads],
+                                  loads=[None if load is None else float(load) for _, load in activity_loads],
+                                  start=start, end=end)
+        ctl, atl, tsb = training_load(loads, initial_ctl=ctl, initial_atl=atl)
+
+        sql = "insert into {table_name} (date, load, ctl, atl, tsb) values (%s,%s,%s,%s,%s) " \
+              "on conflict (date) do update set load=excluded.load, ctl=excluded.ctl, atl=excluded.atl, " \
+              "tsb=excluded.tsb".format(table_name=self.training_load_table)
+        data = zip(days.tolist(), loads.tolist(), ctl.tolist(), atl.tolist(), tsb.tolist())
+        if not data:
+            return 0
+        self.execute_sql(sql=sql, data=data, executemany=True)
+        print "Training load updated for {days} days from {start}".format(days=len(data), start=start)
+        return len(data)
+
+    def top_activities(self, metric, year):
+        """
+        :param metric: column to rank activities by
+        :param year: year to rank, or ALL_TIME
+        :return: (value, activity_id, date) of the best TOP_N activities
+        """
+        sql = "select {metric}, activity_id, _date from {table_name} where {metric} is not null{year} " \
+              "order by {metric} desc, activity_id desc limit %s"
+        if year == ALL_TIME:
+            return self.fetch_all(sql.format(metric=metric, table_name=self.table, year=""), (TOP_N,))
+        return self.fetch_all(sql.format(metric=metric, table_name=self.table, year=" and _date >= %s and _date < %s"),
+                              (datetime.date(year, 1, 1), datetime.date(year + 1, 1, 1), TOP_N))
+
+    def update_records(self, activity_ids):
+        """
+        Puts activities which have just been written onto the personal record leaderboards. Only the all time and
+        activity year leaderboards are read and only the ones which changed are rewritten, so this stays cheap however
+        long the history is. A leaderboard is only rebuilt from the activity table when one of its activities got worse.
+        :param activity_ids: ids of the activities which were inserted or updated
+        :return: number of leaderboards rewritten
+        """
+        written = self.fetch_all("select activity_id, _date, {metrics} from {table_name} where activity_id = any(%s)"
+                                 .format(metrics=", ".join(METRICS), table_name=self.table), (list(activity_ids),))
+        if not written:
+            return 0
+        years = [ALL_TIME] + sorted(set(day.year for _, day in (row[:2] for row in written)))
+        entries = dict(((metric, year), []) for metric in METRICS for year in years)
+        for metric, year, value, activity_id, day in self.fetch_all(
+                "select metric, year, value, activity_id, date from {table_name} where year = any(%s)"
+                .format(table_name=self.records_table), (years,)):
+            if (metric, year) in entries:
+                entries[(metric, year)].append((value, activity_id, day))
+
+        boards = dict((key, Leaderboard(current)) for key, current in entries.items())
+        for row in written:
+            activity_id, day = row[:2]
+            for metric, value in zip(METRICS, row[2:]):
+                boards[(metric, ALL_TIME)].update(value, activity_id, day)
+                boards[(metric, day.year)].update(value, activity_id, day)
+        for key, board in boards.items():
+            if board.stale:
+                boards[key] = Leaderboard(self.top_activities(*key))
+
+        changed = [key for key, board in boards.items() if board.ranked() != sorted(entries[key], reverse=True)]
+        if not changed:
+            return 0
+        records = [(metric, year, rank, activity_id, value, day)
+                   for metric, year in changed
+                   for rank, (value, activity_id, day) in enumerate(boards[(metric, year)].ranked(), 1)]
+        with self.connect() as conn:
+            with conn.cursor() as cursor:
+                cursor.executemany("delete from {table_name} where metric = %s and year = %s"
+                                   .format(table_name=self.records_table), changed)
+                cursor.executemany("insert into {table_name} (metric, year, rank, activity_id, value, date) "
+                                   "values (%s,%s,%s,%s,%s,%s)".format(table_name=self.records_table), records)
+                conn.commit()
+        return len(changed)
 
 
 def summary_printout(user_details, activity_list):
     """
     Method which prints out your lifetime summary stats
     :param user_details: details about the Strava user
-    :param activity_list: list which we will be iterating over
+    :param activity_list: ActivityBatch of your activities
     :return: message containing our stats
     """
     summary = {'activities': len(activity_list),
-               'miles': calculate_list_index(index=3, activity_list=activity_list),
-               'feet': calculate_list_index(index=8, activity_list=activity_list),
-               'calories': calculate_list_index(index=9, activity_list=activity_list),
-               'min_date': calculate_list_index(index=2, activity_list=activity_list, calc=min),
-               'max_date': calculate_list_index(index=2, activity_list=activity_list, calc=max)}
+               'miles': activity_list.total('distance_miles'),
+               'feet': activity_list.total('elevation_feet'),
+               'calories': activity_list.total('kilojoules'),
+               'min_date': activity_list.first_date(),
+               'max_date': activity_list.last_date()}
     message = \
         """Hello {first_name} {last_name}. You have {followers} followers on Strava\n
         You have recorded {act:,} activities between {min_date} and {max_date}\n
@@ -238,5 +449,6 @@ def summary_printout(user_details, activity_list):
 if __name__ == '__main__':
     strava = StravaConnector()
     activities = strava.get_activities()
-    DBConnection('config.conf', 'local').insert_data(data=activities, update_fields=['kudos_count', 'photo_count', 'name'])
+    DBConnection('config.conf', 'local').insert_data(data=activities, update_fields=UPDATE_FIELDS)
     print summary_printout(user_details=strava.get_details(), activity_list=activities)
+    print "{calls} Strava API calls".format(calls=strava.take_call_count())
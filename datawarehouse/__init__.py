@@ -0,0 +1,12 @@
+import os
+
+
+def setup_django():
+    """
+    Configures Django for scripts which run outside of manage.py. Safe to call more than once.
+    """
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "datawarehouse.settings")
+    import django
+    from django.apps import apps
+    if not apps.ready:
+        django.setup()
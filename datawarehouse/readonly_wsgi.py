@@ -0,0 +1,18 @@
+"""
+WSGI config for the read-only activity API (see strava/readonly.py).
+
+Runs next to datawarehouse.wsgi, e.g. mounted on its own port or path prefix:
+
+    $ gunicorn datawarehouse.readonly_wsgi:application --threads 8
+"""
+
+import os
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "datawarehouse.settings")
+django.setup()
+
+from strava.readonly import ReadOnlyAPI
+
+application = ReadOnlyAPI()
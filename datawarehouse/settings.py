@@ -56,6 +56,7 @@ MIDDLEWARE_CLASSES = [
     'django.contrib.auth.middleware.SessionAuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'strava.middleware.ProfilingMiddleware',
 ]
 
 ROOT_URLCONF = 'datawarehouse.urls'
@@ -131,4 +132,11 @@ USE_TZ = True
 
 STATIC_URL = '/static/'
 
-APP_NAME = 'strava'
\ No newline at end of file
+APP_NAME = 'strava'
+
+# Profile every strava API request made by an admin, not just the ones sent with an X-Profile header
+STRAVA_PROFILING = False
+STRAVA_PROFILE_DIR = os.path.join(BASE_DIR, 'profiles')
+
+# API tokens accepted by the read-only API (datawarehouse/readonly_wsgi.py), comma separated
+STRAVA_READONLY_TOKENS = os.environ.get('STRAVA_READONLY_TOKENS', '').split(',')
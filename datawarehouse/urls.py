@@ -25,4 +25,7 @@ from strava import views
 # Additionally, we include login URLs for the browsable API.
 urlpatterns = \
     [url(r'^admin/', admin.site.urls),
-     url(r'^strava/$', views.StravaView.as_view(), name='strava-list')]
+     url(r'^strava/$', views.StravaView.as_view(), name='strava-list'),
+     url(r'^strava/map/$', views.StravaMapView.as_view(), name='strava-map'),
+     url(r'^strava/training-load/$', views.TrainingLoadView.as_view(), name='strava-training-load'),
+     url(r'^strava/records/$', views.PersonalRecordView.as_view(), name='strava-records')]
@@ -0,0 +1,99 @@
+"""
+Geohash helpers for indexing and querying activity start locations.
+"""
+import math
+
+import numpy as np
+
+GEOHASH_PRECISION = 9
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE_LAT = 110.574
+MAX_COVERING_CELLS = 32
+
+_BASE32_ARRAY = np.array(list(BASE32), dtype='S1')
+_BIT_WEIGHTS = np.array([16, 8, 4, 2, 1], dtype=np.uint8)
+
+
+def encode(latitudes, longitudes, precision=GEOHASH_PRECISION):
+    """
+    Geohashes many points at once
+    :param latitudes: array like of latitudes (NaN for missing)
+    :param longitudes: array like of longitudes (NaN for missing)
+    :param precision: number of characters in each geohash
+    :return: object array of geohash strings, None where either coordinate is missing
+    """
+    lat = np.asarray(latitudes, dtype=np.float64)
+    lng = np.asarray(longitudes, dtype=np.float64)
+    valid = ~(np.isnan(lat) | np.isnan(lng))
+    lat, lng = np.where(valid, lat, 0), np.where(valid, lng, 0)
+
+    ranges = {'lat': [np.full(lat.shape, -90.0), np.full(lat.shape, 90.0)],
+              'lng': [np.full(lng.shape, -180.0), np.full(lng.shape, 180.0)]}
+    bits = np.empty((len(lat), precision * 5), dtype=np.uint8)
+    for i in range(precision * 5):
+        # geohash interleaves bits, starting with longitude
+        name, values = ('lng', lng) if i % 2 == 0 else ('lat', lat)
+        low, high = ranges[name]
+        mid = (low + high) / 2
+        bit = values >= mid
+        bits[:, i] = bit
+        ranges[name] = [np.where(bit, mid, low), np.where(bit, high, mid)]
+
+    indexes = bits.reshape(len(lat), precision, 5).dot(_BIT_WEIGHTS)
+    chars = _BASE32_ARRAY[indexes]
+    hashes = np.ascontiguousarray(chars).view('S{precision}'.format(precision=precision)).reshape(len(lat))
+    result = hashes.astype(object)
+    result[~valid] = None
+    return result
+
+
+def encode_point(latitude, longitude, precision=GEOHASH_PRECISION):
+    return encode([latitude], [longitude], precision)[0]
+
+
+def cell_size(precision):
+    """
+    :return: (height, width) in degrees of a geohash cell
+    """
+    bits = precision * 5
+    lng_bits = (bits + 1) // 2
+    lat_bits = bits // 2
+    return 180.0 / 2 ** lat_bits, 360.0 / 2 ** lng_bits
+
+
+def bounding_box(latitude, longitude, radius_km):
+    """
+    :return: (min_lat, min_lng, max_lat, max_lng) of the box surrounding a circle
+    """
+    lat_delta = radius_km / KM_PER_DEGREE_LAT
+    lng_delta = radius_km / (KM_PER_DEGREE_LAT * max(math.cos(math.radians(latitude)), 1e-6))
+    return (max(latitude - lat_delta, -90.0), max(longitude - lng_delta, -180.0),
+            min(latitude + lat_delta, 90.0), min(longitude + lng_delta, 180.0))
+
+
+def covering_cells(min_lat, min_lng, max_lat, max_lng, max_cells=MAX_COVERING_CELLS):
+    """
+    Finds the smallest set of geohash prefixes covering a bounding box, using the finest precision which needs no more
+    than max_cells prefixes
+    :return: sorted list of geohash prefixes
+    """
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        height, width = cell_size(precision)
+        rows = int(math.floor(max_lat / height) - math.floor(min_lat / height)) + 1
+        columns = int(math.floor(max_lng / width) - math.floor(min_lng / width)) + 1
+        if rows * columns <= max_cells:
+            break
+    lats = np.minimum(min_lat + np.arange(rows + 1) * height, max_lat)
+    lngs = np.minimum(min_lng + np.arange(columns + 1) * width, max_lng)
+    grid_lats, grid_lngs = np.meshgrid(lats, lngs)
+    return sorted(set(encode(grid_lats.ravel(), grid_lngs.ravel(), precision)))
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    """
+    Great circle distance in km, works on scalars or arrays
+    """
+    lat1, lng1, lat2, lng2 = [np.radians(value) for value in (lat1, lng1, lat2, lng2)]
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from strava.snapshot import SnapshotExporter
+
+
+class Command(BaseCommand):
+    help = "Exports the activity table to compressed, column oriented files partitioned by year, rewriting only the " \
+           "years which have changed since the last export"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output-dir', default='snapshots', help="Directory for the partitions and manifest")
+        parser.add_argument('--full', action='store_true', default=False,
+                            help="Rewrite every year, not just the changed ones")
+
+    def handle(self, *args, **options):
+        years = SnapshotExporter(options['output_dir']).export(full=options['full'])
+        if years:
+            self.stdout.write("Exported {years} to {directory}".format(years=", ".join(str(year) for year in years),
+                                                                     directory=options['output_dir']))
+        else:
+            self.stdout.write("Nothing has changed since the last export")
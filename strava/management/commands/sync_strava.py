@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from data_fetcher import StravaConnector, DBConnection, UPDATE_FIELDS
+from sync import StravaSync, DEFAULT_INTERVAL, DEFAULT_JITTER, DEFAULT_LOCK_FILE
+
+
+class Command(BaseCommand):
+    help = "Syncs activities from the Strava API without prompting, either once or as a long running daemon"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--daemon', action='store_true', default=False,
+                            help="Keep running and sync on an interval until SIGTERM")
+        parser.add_argument('--interval', type=int, default=DEFAULT_INTERVAL,
+                            help="Seconds between syncs when running as a daemon")
+        parser.add_argument('--jitter', type=int, default=DEFAULT_JITTER,
+                            help="Maximum random seconds added to each interval")
+        parser.add_argument('--lock-file', default=DEFAULT_LOCK_FILE,
+                            help="Lock file used to skip overlapping syncs")
+        parser.add_argument('--config', default='config.conf', help="DB config file")
+        parser.add_argument('--section', default='local', help="Section of the DB config file")
+        parser.add_argument('--profile', metavar='DIR',
+                            help="Write cProfile and collapsed stack profiles of each stage of every sync to DIR")
+
+    def handle(self, *args, **options):
+        try:
+            connector = StravaConnector(interactive=False)
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        syncer = StravaSync(connector=connector,
+                            db=DBConnection(options['config'], options['section'], persistent=True),
+                            update_fields=UPDATE_FIELDS,
+                            interval=options['interval'],
+                            jitter=options['jitter'],
+                            lock_path=options['lock_file'],
+                            profile_dir=options['profile'])
+
+        if options['daemon']:
+            syncer.install_signal_handlers()
+            self.stdout.write("Syncing every {interval}s...".format(interval=options['interval']))
+            syncer.run_forever()
+        else:
+            try:
+                rows = syncer.run_once()
+            finally:
+                syncer.db.close()
+            if rows is None:
+                self.stdout.write("Another sync is already running")
+            else:
+                self.stdout.write("Sync complete ({rows} rows)".format(rows=rows))
@@ -0,0 +1,71 @@
+import cProfile
+import datetime
+import os
+
+from django.conf import settings
+from django.db import connection
+
+from strava.profiling import StackSampler
+
+PROFILE_HEADER = 'HTTP_X_PROFILE'
+
+
+class ProfilingMiddleware(object):
+
+    """
+    Profiles requests to the strava API views for admin users, either for every request when the STRAVA_PROFILING
+    setting is on or only for requests sent with an X-Profile header. Each profiled request writes a cProfile dump, a
+    collapsed stack file and the SQL it ran to STRAVA_PROFILE_DIR, and reports its query count and SQL time in the
+    response headers.
+    """
+
+    def should_profile(self, request, view_func):
+        view_class = getattr(view_func, 'cls', view_func)
+        if view_class.__module__ != 'strava.views':
+            return False
+        user = getattr(request, 'user', None)
+        if user is None or not user.is_staff:
+            return False
+        return getattr(settings, 'STRAVA_PROFILING', False) or PROFILE_HEADER in request.META
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if not self.should_profile(request, view_func):
+            return None
+        # the same switch CaptureQueriesContext flips, without forcing a connection before the view asks for one
+        request.profiling = {'name': '{view}-{time}'.format(view=getattr(view_func, '__name__', 'view'),
+                                                            time=datetime.datetime.now().strftime('%Y%m%d-%H%M%S-%f')),
+                             'debug_cursor': connection.force_debug_cursor,
+                             'queries_before': len(connection.queries_log),
+                             'profile': cProfile.Profile(),
+                             'sampler': StackSampler()}
+        connection.force_debug_cursor = True
+        request.profiling['sampler'].start()
+        request.profiling['profile'].enable()
+        return None
+
+    def process_response(self, request, response):
+        profiling = getattr(request, 'profiling', None)
+        if profiling is None:
+            return response
+        del request.profiling
+        # DRF renders inside the view, so the response content is already included in the profile
+        profiling['profile'].disable()
+        profiling['sampler'].stop()
+        connection.force_debug_cursor = profiling['debug_cursor']
+        queries = list(connection.queries_log)[profiling['queries_before']:]
+        sql_ms = sum(float(query['time']) for query in queries) * 1000
+
+        output_dir = getattr(settings, 'STRAVA_PROFILE_DIR', os.path.join(settings.BASE_DIR, 'profiles'))
+        if not os.path.isdir(output_dir):
+            os.makedirs(output_dir)
+        path = os.path.join(output_dir, profiling['name'])
+        profiling['profile'].dump_stats(path + '.prof')
+        profiling['sampler'].write(path + '.collapsed')
+        with open(path + '.sql', 'w') as sql_file:
+            for query in queries:
+                sql_file.write('-- {time}s\n{sql};\n'.format(time=query['time'], sql=query['sql']))
+
+        response['X-Profile-Queries'] = str(len(queries))
+        response['X-Profile-SQL-ms'] = '{ms:.1f}'.format(ms=sql_ms)
+        response['X-Profile-File'] = path + '.collapsed'
+        return response
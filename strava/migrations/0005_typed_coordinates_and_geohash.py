@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+from strava.geo import encode
+
+CHUNK_SIZE = 5000
+
+
+def write_geohashes(cursor, table, rows):
+    """
+    Sets the geohash of a chunk of (activity_id, latitude, longitude) rows with one UPDATE
+    """
+    activity_ids, latitudes, longitudes = zip(*rows)
+    values = [value for pair in zip(activity_ids, encode(latitudes, longitudes)) for value in pair]
+    cursor.execute("update {table} set geohash = v.geohash from (values {holders}) v (activity_id, geohash) "
+                   "where {table}.activity_id = v.activity_id".format(
+                       table=table, holders=",".join("(%s, %s)" for _ in rows)), values)
+
+
+def populate_geohash(apps, schema_editor):
+    Strava = apps.get_model('strava', 'Strava')
+    rows = Strava.objects.filter(latitude__isnull=False, longitude__isnull=False) \
+        .values_list('activity_id', 'latitude', 'longitude').iterator()
+    chunk = []
+    with schema_editor.connection.cursor() as cursor:
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) == CHUNK_SIZE:
+                write_geohashes(cursor, Strava._meta.db_table, chunk)
+                chunk = []
+        if chunk:
+            write_geohashes(cursor, Strava._meta.db_table, chunk)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('strava', '0004_strava_photo_count'),
+    ]
+
+    operations = [
+        # longitude was stored as text, so anything which won't cast to a number is dropped before changing the type
+        migrations.RunSQL(
+            "update strava_strava set longitude = null "
+            r"where longitude !~ '^\s*[-+]?([0-9]+\.?[0-9]*|\.[0-9]+)([eE][-+]?[0-9]+)?\s*$'",
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        migrations.AlterField(
+            model_name='strava',
+            name='longitude',
+            field=models.FloatField(null=True),
+        ),
+        migrations.AddField(
+            model_name='strava',
+            name='geohash',
+            field=models.CharField(db_index=True, max_length=12, null=True),
+        ),
+        migrations.AlterIndexTogether(
+            name='strava',
+            index_together=set([('latitude', 'longitude')]),
+        ),
+        migrations.RunPython(populate_geohash, migrations.RunPython.noop),
+    ]
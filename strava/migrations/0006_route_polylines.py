@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('strava', '0005_typed_coordinates_and_geohash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='strava',
+            name='summary_polyline',
+            field=models.TextField(null=True),
+        ),
+        migrations.AddField(
+            model_name='strava',
+            name='polyline_medium',
+            field=models.TextField(null=True),
+        ),
+        migrations.AddField(
+            model_name='strava',
+            name='polyline_low',
+            field=models.TextField(null=True),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('strava', '0006_route_polylines'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrainingLoad',
+            fields=[
+                ('date', models.DateField(primary_key=True, serialize=False)),
+                ('load', models.FloatField()),
+                ('ctl', models.FloatField()),
+                ('atl', models.FloatField()),
+                ('tsb', models.FloatField()),
+            ],
+        ),
+    ]
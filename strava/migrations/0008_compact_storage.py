@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    """
+    Moves the numeric columns to native types. Postgres converts the existing values in place (ALTER COLUMN ... TYPE
+    ... USING column::type), rounding the times to whole seconds.
+    """
+
+    dependencies = [
+        ('strava', '0007_trainingload'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='strava',
+            name='distance_miles',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='strava',
+            name='avg_power',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='strava',
+            name='moving_time_seconds',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='strava',
+            name='elapsed_time_seconds',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='strava',
+            name='kudos_count',
+            field=models.SmallIntegerField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='strava',
+            name='elevation_feet',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='strava',
+            name='kilojoules',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='strava',
+            name='photo_count',
+            field=models.SmallIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+import strava.models
+from strava.search import SEARCH_CONFIG
+
+
+class Migration(migrations.Migration):
+    """
+    Adds the full-text search vector for activity names, fills it in for the activities we already hold and indexes it
+    with GIN. Django 1.9 has no GIN index support, so the index is plain SQL.
+    """
+
+    dependencies = [
+        ('strava', '0008_compact_storage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='strava',
+            name='name_search',
+            field=strava.models.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunSQL(
+            "update strava_strava set name_search = to_tsvector('{config}', name)".format(config=SEARCH_CONFIG),
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        migrations.RunSQL(
+            "create index strava_strava_name_search_gin on strava_strava using gin (name_search)",
+            reverse_sql="drop index strava_strava_name_search_gin",
+        ),
+    ]
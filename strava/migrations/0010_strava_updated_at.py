@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('strava', '0009_name_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='strava',
+            name='updated_at',
+            field=models.DateTimeField(db_index=True, editable=False, null=True),
+        ),
+    ]
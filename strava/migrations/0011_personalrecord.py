@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+from strava.records import METRICS, TOP_N, ALL_TIME
+
+
+def populate_records(apps, schema_editor):
+    Strava = apps.get_model('strava', 'Strava')
+    PersonalRecord = apps.get_model('strava', 'PersonalRecord')
+    years = [ALL_TIME] + [day.year for day in Strava.objects.dates('_date', 'year')]
+    records = []
+    for metric in METRICS:
+        for year in years:
+            activities = Strava.objects.filter(**{metric + '__isnull': False})
+            if year != ALL_TIME:
+                activities = activities.filter(_date__year=year)
+            top = activities.order_by('-' + metric, '-activity_id').values_list('activity_id', metric, '_date')[:TOP_N]
+            records.extend(PersonalRecord(metric=metric, year=year, rank=rank, activity_id=activity_id, value=value,
+                                          date=date)
+                           for rank, (activity_id, value, date) in enumerate(top, 1))
+    PersonalRecord.objects.bulk_create(records)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('strava', '0010_strava_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PersonalRecord',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('metric', models.CharField(max_length=32)),
+                ('year', models.SmallIntegerField()),
+                ('rank', models.SmallIntegerField()),
+                ('value', models.FloatField()),
+                ('date', models.DateField()),
+                ('activity', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='strava.Strava')),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='personalrecord',
+            unique_together=set([('metric', 'year', 'rank')]),
+        ),
+        migrations.RunPython(populate_records, migrations.RunPython.noop),
+    ]
@@ -2,10 +2,25 @@ from __future__ import unicode_literals
 
 from django.db import models
 
+from strava import polyline
+
 import os
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "datawarehouse.settings")
 
 
+class SearchVectorField(models.Field):
+    """
+    Postgres tsvector column. Only ever written by SQL (see DBConnection.insert_data), never by the ORM.
+    """
+
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault('editable', False)
+        super(SearchVectorField, self).__init__(*args, **kwargs)
+
+    def db_type(self, connection):
+        return 'tsvector'
+
+
 class Strava(models.Model):
     """
     Model which holds all of my cycling data
@@ -13,17 +28,63 @@ class Strava(models.Model):
     activity_id = models.IntegerField(primary_key=True)
     name = models.TextField()
     _date = models.DateField()
-    distance_miles = models.DecimalField(max_digits=10, decimal_places=4, null=True, blank=True)
-    avg_power = models.DecimalField(max_digits=10, decimal_places=4, null=True, blank=True)
-    moving_time_seconds = models.DecimalField(max_digits=18, decimal_places=4, null=True, blank=True)
-    elapsed_time_seconds = models.DecimalField(max_digits=18, decimal_places=4, null=True, blank=True)
-    kudos_count = models.IntegerField(null=True, blank=True)
-    elevation_feet = models.DecimalField(max_digits=18, decimal_places=4, null=True, blank=True)
-    kilojoules = models.DecimalField(max_digits=10, decimal_places=4, null=True, blank=True)
+    distance_miles = models.FloatField(null=True, blank=True)
+    avg_power = models.FloatField(null=True, blank=True)
+    moving_time_seconds = models.IntegerField(null=True, blank=True)
+    elapsed_time_seconds = models.IntegerField(null=True, blank=True)
+    kudos_count = models.SmallIntegerField(null=True, blank=True)
+    elevation_feet = models.FloatField(null=True, blank=True)
+    kilojoules = models.FloatField(null=True, blank=True)
     country = models.TextField(null=True)
     city = models.TextField(null=True)
     latitude = models.FloatField(null=True)
-    longitude = models.TextField(null=True)
+    longitude = models.FloatField(null=True)
+    geohash = models.CharField(max_length=12, null=True, db_index=True)
     is_stationary_trainer = models.BooleanField(default=False)
-    photo_count = models.IntegerField(default=0)
+    photo_count = models.SmallIntegerField(default=0)
+    summary_polyline = models.TextField(null=True)
+    polyline_medium = models.TextField(null=True)
+    polyline_low = models.TextField(null=True)
+    # to_tsvector('english', name), searched by the activity API's ?search=
+    name_search = SearchVectorField(null=True)
+    # set when ingestion inserts or changes a row, so exports know which years have changed
+    updated_at = models.DateTimeField(null=True, db_index=True, editable=False)
+
+    class Meta:
+        index_together = [['latitude', 'longitude']]
+
+    @property
+    def route(self):
+        """
+        The full resolution route as a (n, 2) array of (latitude, longitude), decoded the first time it's asked for
+        """
+        if not hasattr(self, '_route'):
+            self._route = polyline.decode(self.summary_polyline)
+        return self._route
+
+
+class TrainingLoad(models.Model):
+    """
+    Model which holds my fitness (CTL), fatigue (ATL) and form (TSB) for every day, based on kilojoules burned
+    """
+    date = models.DateField(primary_key=True)
+    load = models.FloatField()
+    ctl = models.FloatField()
+    atl = models.FloatField()
+    tsb = models.FloatField()
+
+
+class PersonalRecord(models.Model):
+    """
+    Model which holds my top activities for each metric, all time (year 0) and for each year. Maintained by ingestion,
+    see strava.records.
+    """
+    metric = models.CharField(max_length=32)
+    year = models.SmallIntegerField()
+    rank = models.SmallIntegerField()
+    activity = models.ForeignKey(Strava, on_delete=models.CASCADE)
+    value = models.FloatField()
+    date = models.DateField()
 
+    class Meta:
+        unique_together = [['metric', 'year', 'rank']]
@@ -0,0 +1,109 @@
+"""
+Google encoded polyline helpers and Douglas-Peucker simplification for drawing routes at different zoom levels.
+"""
+import numpy as np
+
+PRECISION = 1e5
+
+# (model field, Douglas-Peucker tolerance in degrees, highest map zoom level the tier is served at).
+# Ordered from the most to the least simplified; the last tier is the untouched polyline from Strava.
+TIERS = [('polyline_low', 1e-3, 10),
+         ('polyline_medium', 1e-4, 13),
+         ('summary_polyline', None, None)]
+
+
+def decode(encoded):
+    """
+    Decodes a Google encoded polyline without looping over the characters in Python
+    :param encoded: encoded polyline string
+    :return: (n, 2) float array of (latitude, longitude)
+    """
+    if not encoded:
+        return np.empty((0, 2), dtype=np.float64)
+    chars = np.frombuffer(encoded.encode('ascii') if isinstance(encoded, unicode) else encoded,
+                          dtype=np.uint8).astype(np.int64) - 63
+    # every value is a run of 5 bit chunks, the last chunk of a run is the one without the 0x20 continuation bit
+    ends = np.flatnonzero(chars < 0x20)
+    starts = np.concatenate(([0], ends[:-1] + 1))
+    position = np.arange(len(chars)) - np.repeat(starts, ends - starts + 1)
+    values = np.add.reduceat((chars & 0x1f) << (5 * position), starts)
+    values = np.where(values & 1, ~(values >> 1), values >> 1)
+    return np.cumsum(values.reshape(-1, 2), axis=0) / PRECISION
+
+
+def _encode_value(value):
+    value = ~(value << 1) if value < 0 else value << 1
+    chunks = []
+    while value >= 0x20:
+        chunks.append(chr((0x20 | (value & 0x1f)) + 63))
+        value >>= 5
+    chunks.append(chr(value + 63))
+    return ''.join(chunks)
+
+
+def encode(coordinates):
+    """
+    :param coordinates: (n, 2) array like of (latitude, longitude)
+    :return: Google encoded polyline string
+    """
+    points = np.round(np.asarray(coordinates, dtype=np.float64).reshape(-1, 2) * PRECISION).astype(np.int64)
+    deltas = np.diff(np.vstack(([[0, 0]], points)), axis=0)
+    return ''.join(_encode_value(int(value)) for value in deltas.ravel())
+
+
+def simplify(coordinates, tolerance):
+    """
+    Douglas-Peucker simplification, keeping every point further than tolerance from the simplified line
+    :param coordinates: (n, 2) array of points
+    :param tolerance: maximum distance (in the same units as the coordinates) a dropped point may be from the line
+    :return: (m, 2) array of the points which were kept
+    """
+    points = np.asarray(coordinates, dtype=np.float64)
+    if len(points) < 3:
+        return points
+    keep = np.zeros(len(points), dtype=bool)
+    keep[[0, -1]] = True
+    stack = [(0, len(points) - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        start, end = points[first], points[last]
+        segment = end - start
+        between = points[first + 1:last] - start
+        length = np.hypot(*segment)
+        if length == 0:
+            distances = np.hypot(between[:, 0], between[:, 1])
+        else:
+            distances = np.abs(segment[0] * between[:, 1] - segment[1] * between[:, 0]) / length
+        furthest = np.argmax(distances)
+        if distances[furthest] > tolerance:
+            index = first + 1 + furthest
+            keep[index] = True
+            stack.append((first, index))
+            stack.append((index, last))
+    return points[keep]
+
+
+def build_tiers(encoded):
+    """
+    :param encoded: full resolution encoded polyline
+    :return: dict of tier field name to encoded polyline for that tier
+    """
+    if not encoded:
+        return dict((field, None) for field, _, _ in TIERS)
+    coordinates = decode(encoded)
+    tiers = {}
+    for field, tolerance, _ in TIERS:
+        tiers[field] = encoded if tolerance is None else encode(simplify(coordinates, tolerance))
+    return tiers
+
+
+def tier_for_zoom(zoom):
+    """
+    :param zoom: web map zoom level (0 is the whole world)
+    :return: name of the polyline field to serve at that zoom
+    """
+    for field, _, max_zoom in TIERS:
+        if max_zoom is None or zoom <= max_zoom:
+            return field
@@ -0,0 +1,117 @@
+"""
+Opt-in profiling for ingestion runs and API requests.
+
+Each profiled stage writes a cProfile dump (<name>.prof, for pstats / snakeviz) and a sampled, collapsed-stack file
+(<name>.collapsed) which can be fed straight into flamegraph.pl or speedscope.
+"""
+import collections
+import contextlib
+import cProfile
+import os
+import sys
+import threading
+import time
+
+DEFAULT_INTERVAL = 0.005
+
+
+def collapse(frame):
+    """
+    :param frame: innermost frame of a stack
+    :return: stack in collapsed format, outermost frame first, e.g. "cli.py:main;data_fetcher.py:get_activities"
+    """
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append('{file}:{function}'.format(file=os.path.basename(code.co_filename), function=code.co_name))
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+class StackSampler(object):
+
+    """
+    Samples the stack of one thread from a background thread, counting how often each stack is seen
+    """
+
+    def __init__(self, thread_id=None, interval=DEFAULT_INTERVAL):
+        self.thread_id = thread_id or threading.current_thread().ident
+        self.interval = interval
+        self.counts = collections.Counter()
+        self.running = False
+        self.thread = None
+
+    def sample(self):
+        while self.running:
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.counts[collapse(frame)] += 1
+            time.sleep(self.interval)
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self.sample)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def write(self, path):
+        with open(path, 'w') as collapsed:
+            for stack, count in sorted(self.counts.items()):
+                collapsed.write('{stack} {count}\n'.format(stack=stack, count=count))
+
+
+class Profiler(object):
+
+    """
+    Profiles named stages of a run. When output_dir is None nothing is profiled, so callers can always wrap their
+    stages and let a --profile option decide.
+    """
+
+    def __init__(self, output_dir=None, run_name='run', interval=DEFAULT_INTERVAL):
+        self.output_dir = output_dir
+        self.run_name = run_name
+        self.interval = interval
+        self.timings = collections.OrderedDict()
+        if self.enabled and not os.path.isdir(output_dir):
+            os.makedirs(output_dir)
+
+    @property
+    def enabled(self):
+        return bool(self.output_dir)
+
+    def path(self, stage, extension):
+        return os.path.join(self.output_dir, '{run}-{stage}.{extension}'.format(run=self.run_name, stage=stage,
+                                                                                 extension=extension))
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        if not self.enabled:
+            yield
+            return
+        profile = cProfile.Profile()
+        sampler = StackSampler(interval=self.interval)
+        started = time.time()
+        sampler.start()
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            sampler.stop()
+            self.timings[name] = time.time() - started
+            profile.dump_stats(self.path(name, 'prof'))
+            sampler.write(self.path(name, 'collapsed'))
+
+    def report(self):
+        """
+        :return: one line per stage with how long it took and where its profiles were written
+        """
+        return '\n'.join('{stage}: {seconds:.2f}s ({path})'.format(stage=stage, seconds=seconds,
+                                                                   path=self.path(stage, 'collapsed'))
+                         for stage, seconds in self.timings.items())
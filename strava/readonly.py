@@ -0,0 +1,179 @@
+"""
+Minimal read-only WSGI API for the activity listing and yearly totals, served without Django's middleware, DRF or the
+ORM. Requests are authorised with a token from STRAVA_READONLY_TOKENS, the SQL is built once at import and prepared
+once per database connection, and Postgres formats every value so rows go straight into the JSON encoder.
+
+    GET /activities/?page=2        same fields and page shape as /strava/
+    GET /summary/                  totals for each year
+
+Send the token as `Authorization: Token <token>`.
+"""
+import hmac
+import json
+import urllib
+import urlparse
+import weakref
+
+from django.conf import settings
+from django.db import connection, DatabaseError, InterfaceError
+
+TABLE = 'strava_strava'
+PAGE_SIZE = settings.REST_FRAMEWORK.get('PAGE_SIZE', 50)
+CACHE_SECONDS = 60
+STATUSES = {200: '200 OK', 401: '401 Unauthorized', 404: '404 Not Found', 405: '405 Method Not Allowed'}
+
+# the columns of StravaSerializer, formatted the way it formats them
+ACTIVITY_COLUMNS = [('activity_id', 'activity_id'),
+                    ('name', 'name'),
+                    ('_date', '_date::text'),
+                    ('distance_miles', 'distance_miles::numeric(10, 4)::text'),
+                    ('city', 'city'),
+                    ('country', 'country'),
+                    ('kilojoules', 'kilojoules::numeric(10, 4)::text')]
+SUMMARY_COLUMNS = [('year', 'extract(year from _date)::integer'),
+                   ('activities', 'count(*)'),
+                   ('distance_miles', 'round(coalesce(sum(distance_miles), 0)::numeric, 1)::float'),
+                   ('elevation_feet', 'round(coalesce(sum(elevation_feet), 0)::numeric)::integer'),
+                   ('moving_time_seconds', 'coalesce(sum(moving_time_seconds), 0)'),
+                   ('kilojoules', 'round(coalesce(sum(kilojoules), 0)::numeric)::integer')]
+
+
+def select(columns):
+    return ", ".join(expression for _, expression in columns)
+
+
+class PreparedQuery(object):
+
+    """
+    SQL statement which is PREPAREd the first time it's run on a connection, then only EXECUTEd
+    """
+
+    def __init__(self, name, sql, parameters=0):
+        """
+        :param name: name of the prepared statement
+        :param sql: the statement, using $1, $2... for its parameters
+        :param parameters: number of parameters it takes
+        """
+        self.name = name
+        self.sql = sql
+        self.execute_sql = "execute {name}".format(name=name) + \
+                           ("({holders})".format(holders=",".join(["%s"] * parameters)) if parameters else "")
+        self.prepared_on = weakref.WeakKeyDictionary()
+
+    def execute(self, cursor, params=()):
+        raw_connection = cursor.connection
+        if raw_connection not in self.prepared_on:
+            cursor.execute("prepare {name} as {sql}".format(name=self.name, sql=self.sql))
+            self.prepared_on[raw_connection] = True
+        cursor.execute(self.execute_sql, params)
+        return cursor.fetchall()
+
+
+ACTIVITY_PAGE = PreparedQuery(
+    'readonly_activity_page',
+    "select {columns} from {table} order by activity_id desc limit $1 offset $2".format(
+        columns=select(ACTIVITY_COLUMNS), table=TABLE),
+    parameters=2)
+ACTIVITY_COUNT = PreparedQuery('readonly_activity_count', "select count(*) from {table}".format(table=TABLE))
+SUMMARY = PreparedQuery(
+    'readonly_summary',
+    "select {columns} from {table} group by 1 order by 1".format(columns=select(SUMMARY_COLUMNS), table=TABLE))
+
+
+class HttpError(Exception):
+
+    def __init__(self, status, detail):
+        super(HttpError, self).__init__(detail)
+        self.status = status
+        self.detail = detail
+
+
+def get_tokens():
+    return [token for token in getattr(settings, 'STRAVA_READONLY_TOKENS', []) if token]
+
+
+class ReadOnlyAPI(object):
+
+    """
+    WSGI application serving the read-only endpoints
+    """
+
+    def __init__(self, tokens=None, page_size=PAGE_SIZE):
+        """
+        :param tokens: accepted API tokens (defaults to the STRAVA_READONLY_TOKENS setting)
+        :param page_size: activities per page
+        """
+        self.tokens = get_tokens() if tokens is None else tokens
+        self.page_size = page_size
+        self.routes = {'/activities/': self.activities,
+                       '/summary/': self.summary}
+
+    def authorised(self, environ):
+        scheme, _, token = environ.get('HTTP_AUTHORIZATION', '').partition(' ')
+        if scheme.lower() != 'token' or not token:
+            return False
+        # compare against every token in constant time, so timing doesn't give away how much of a token was right
+        return any([hmac.compare_digest(str(token), str(allowed)) for allowed in self.tokens])
+
+    def query(self, prepared, params=()):
+        """
+        Runs a prepared query on this thread's connection, which is kept open between requests. A broken connection is
+        dropped so the next request reconnects.
+        """
+        try:
+            with connection.cursor() as cursor, connection.wrap_database_errors:
+                return prepared.execute(cursor.cursor, params)
+        except (DatabaseError, InterfaceError):
+            connection.close()
+            raise
+
+    def page_url(self, environ, page):
+        if page is None:
+            return None
+        url = "{scheme}://{host}{path}".format(scheme=environ.get('wsgi.url_scheme', 'http'),
+                                               host=environ.get('HTTP_HOST') or environ.get('SERVER_NAME', ''),
+                                               path=environ.get('SCRIPT_NAME', '') + environ.get('PATH_INFO', ''))
+        return url if page == 1 else url + '?' + urllib.urlencode({'page': page})
+
+    def activities(self, environ, params):
+        try:
+            page = int(params.get('page', 1))
+        except ValueError:
+            raise HttpError(404, "Invalid page.")
+        count = self.query(ACTIVITY_COUNT)[0][0]
+        if page < 1 or (page > 1 and (page - 1) * self.page_size >= count):
+            raise HttpError(404, "Invalid page.")
+        rows = self.query(ACTIVITY_PAGE, (self.page_size, (page - 1) * self.page_size))
+        names = [name for name, _ in ACTIVITY_COLUMNS]
+        return {'count': count,
+                'next': self.page_url(environ, page + 1 if page * self.page_size < count else None),
+                'previous': self.page_url(environ, page - 1 if page > 1 else None),
+                'results': [dict(zip(names, row)) for row in rows]}
+
+    def summary(self, environ, params):
+        names = [name for name, _ in SUMMARY_COLUMNS]
+        return {'results': [dict(zip(names, row)) for row in self.query(SUMMARY)]}
+
+    def respond(self, start_response, status, body, headers=()):
+        payload = json.dumps(body, separators=(',', ':'))
+        start_response(status, [('Content-Type', 'application/json'),
+                                ('Content-Length', str(len(payload)))] + list(headers))
+        return [payload]
+
+    def __call__(self, environ, start_response):
+        try:
+            if environ['REQUEST_METHOD'] != 'GET':
+                raise HttpError(405, "Method not allowed.")
+            if not self.authorised(environ):
+                raise HttpError(401, "Invalid token.")
+            handler = self.routes.get(environ.get('PATH_INFO', ''))
+            if handler is None:
+                raise HttpError(404, "Not found.")
+            params = dict((key, values[-1]) for key, values in
+                          urlparse.parse_qs(environ.get('QUERY_STRING', '')).items())
+            body = handler(environ, params)
+        except HttpError as e:
+            headers = [('WWW-Authenticate', 'Token')] if e.status == 401 else []
+            return self.respond(start_response, STATUSES[e.status], {'detail': e.detail}, headers)
+        return self.respond(start_response, STATUSES[200], body,
+                            [('Cache-Control', 'private, max-age={seconds}'.format(seconds=CACHE_SECONDS))])
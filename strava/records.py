@@ -0,0 +1,70 @@
+"""
+Personal records: the top N activities for each metric, all time and for each year.
+
+Each leaderboard is a bounded min-heap, so offering a new activity costs O(log N) however long the history is. A new
+or improved value can only push other activities down, which the heap handles. When an activity already on a
+leaderboard gets a lower value, the activity that should replace it could be anywhere in the history, so that one
+leaderboard has to be rebuilt from the database.
+"""
+import heapq
+import math
+
+METRICS = ('distance_miles', 'elevation_feet', 'kilojoules', 'kudos_count')
+TOP_N = 10
+# year stored for the all time leaderboards
+ALL_TIME = 0
+
+
+def missing(value):
+    return value is None or (isinstance(value, float) and math.isnan(value))
+
+
+class Leaderboard(object):
+
+    """
+    Top N (value, activity_id, date) entries for one metric and year
+    """
+
+    def __init__(self, entries=(), size=TOP_N):
+        """
+        :param entries: (value, activity_id, date) tuples already on the leaderboard
+        :param size: number of places on the leaderboard
+        """
+        self.size = size
+        self.heap = []
+        for entry in entries:
+            self.offer(*entry)
+        self.stale = False
+
+    def offer(self, value, activity_id, date):
+        """
+        Puts an activity on the leaderboard if it's good enough, in O(log N)
+        """
+        if missing(value):
+            return
+        entry = (value, activity_id, date)
+        if len(self.heap) < self.size:
+            heapq.heappush(self.heap, entry)
+        elif entry > self.heap[0]:
+            heapq.heappushpop(self.heap, entry)
+
+    def update(self, value, activity_id, date):
+        """
+        Records a new or changed activity. If an activity already on the leaderboard got worse, the leaderboard is
+        marked stale instead, as only the full history can say what takes its place.
+        """
+        for position, (current, entry_id, _) in enumerate(self.heap):
+            if entry_id == activity_id:
+                if missing(value) or value < current:
+                    self.stale = True
+                elif value > current:
+                    self.heap[position] = (value, activity_id, date)
+                    heapq.heapify(self.heap)
+                return
+        self.offer(value, activity_id, date)
+
+    def ranked(self):
+        """
+        :return: entries, best first
+        """
+        return sorted(self.heap, reverse=True)
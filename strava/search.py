@@ -0,0 +1,11 @@
+"""
+Full-text search over activity names. The vector is kept in its own GIN indexed column, written by the same upsert
+which writes the name, so searching never has to scan the table.
+"""
+SEARCH_CONFIG = 'english'
+SEARCH_FIELD = 'name_search'
+
+VECTOR_SQL = "to_tsvector('{config}', %s)".format(config=SEARCH_CONFIG)
+QUERY_SQL = "plainto_tsquery('{config}', %s)".format(config=SEARCH_CONFIG)
+MATCH_SQL = "{field} @@ {query}".format(field=SEARCH_FIELD, query=QUERY_SQL)
+RANK_SQL = "ts_rank({field}, {query})".format(field=SEARCH_FIELD, query=QUERY_SQL)
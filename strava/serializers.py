@@ -1,8 +1,12 @@
-from models import Strava
+from models import Strava, TrainingLoad, PersonalRecord
 from rest_framework import serializers
 
 
 class StravaSerializer(serializers.ModelSerializer):
+    # these columns used to be numeric, keep serialising them as fixed point strings so the API output doesn't change
+    distance_miles = serializers.DecimalField(max_digits=10, decimal_places=4, allow_null=True, read_only=True)
+    kilojoules = serializers.DecimalField(max_digits=10, decimal_places=4, allow_null=True, read_only=True)
+
     class Meta:
         model = Strava
         fields = ('activity_id',
@@ -12,3 +16,33 @@ class StravaSerializer(serializers.ModelSerializer):
                   'city',
                   'country',
                   'kilojoules')
+
+
+class RouteSerializer(serializers.Serializer):
+    activity_id = serializers.IntegerField()
+    name = serializers.CharField()
+    polyline = serializers.CharField()
+
+
+class TrainingLoadSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = TrainingLoad
+        fields = ('date',
+                  'load',
+                  'ctl',
+                  'atl',
+                  'tsb')
+
+
+class PersonalRecordSerializer(serializers.ModelSerializer):
+    name = serializers.CharField(source='activity.name', read_only=True)
+
+    class Meta:
+        model = PersonalRecord
+        fields = ('metric',
+                  'year',
+                  'rank',
+                  'activity_id',
+                  'name',
+                  'value',
+                  'date')
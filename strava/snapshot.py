@@ -0,0 +1,125 @@
+"""
+Column oriented snapshots of the activity table for BI tools, one compressed file per year.
+
+Each partition is a NumPy .npz archive holding one array per column (read it with numpy.load, no pickling needed) and
+manifest.json records what was exported when. Ingestion stamps every row it inserts or changes with updated_at, so
+later exports only rewrite the years which have changed since the last one.
+"""
+import json
+import os
+
+import numpy as np
+from django.db import connection
+from django.utils.dateparse import parse_datetime
+
+from activities import ACTIVITY_DTYPE
+from strava.models import Strava
+
+MANIFEST = 'manifest.json'
+PARTITION = 'activities-{year}.npz'
+# the simplified routes can be rebuilt from the full polyline, so they're left out of the snapshots
+FIELDS = [field for field in ACTIVITY_DTYPE.names if field not in ('polyline_medium', 'polyline_low')]
+
+
+def to_columns(rows, fields=FIELDS):
+    """
+    :param rows: tuples of values in `fields` order, as they come from the database
+    :param fields: names of the columns
+    :return: dict of field name to array, with NaN for missing numbers, '' for missing text and 0 for missing counts
+    """
+    values = zip(*rows) if rows else [()] * len(fields)
+    columns = {}
+    for field, column in zip(fields, values):
+        dtype = ACTIVITY_DTYPE[field]
+        if dtype.kind == 'O':
+            columns[field] = np.array([u'' if value is None else value for value in column], dtype=np.unicode_)
+        elif dtype.kind == 'f':
+            columns[field] = np.array([np.nan if value is None else value for value in column], dtype=dtype)
+        elif dtype.kind in 'iu':
+            columns[field] = np.array([value or 0 for value in column], dtype=dtype)
+        else:
+            columns[field] = np.array(column, dtype=dtype)
+    return columns
+
+
+class SnapshotExporter(object):
+
+    """
+    Writes the year partitions and manifest to a directory, rewriting only the years changed since the last export
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def read_manifest(self):
+        try:
+            with open(self.path(MANIFEST)) as manifest:
+                return json.load(manifest)
+        except IOError:
+            return {'exported_at': None, 'partitions': {}}
+
+    def replace(self, name, write):
+        """
+        Writes to a temporary file and renames it into place, so readers never see a half written file
+        """
+        temporary = self.path(name + '.tmp')
+        with open(temporary, 'wb') as output:
+            write(output)
+        os.rename(temporary, self.path(name))
+
+    def change_marker(self):
+        """
+        Time from which the next export looks for changes. It comes from the database's clock, like updated_at, and is
+        no later than the start of any transaction still open, as an ingest which commits after this export has read
+        the table can have stamped its rows with any time since it started.
+        """
+        with connection.cursor() as cursor:
+            cursor.execute("select least(clock_timestamp(), min(xact_start)) from pg_stat_activity "
+                           "where datname = current_database() and pid <> pg_backend_pid()")
+            return cursor.fetchone()[0]
+
+    def changed_years(self, since):
+        """
+        :param since: datetime of the last export, or None for every year
+        :return: sorted years holding an activity which was written after `since`
+        """
+        queryset = Strava.objects.all() if since is None else Strava.objects.filter(updated_at__gte=since)
+        return sorted(set(day.year for day in queryset.dates('_date', 'year')))
+
+    def year_rows(self, year):
+        return list(Strava.objects.filter(_date__year=year).order_by('_date', 'activity_id').values_list(*FIELDS))
+
+    def export(self, full=False):
+        """
+        :param full: rewrite every year, not just the changed ones
+        :return: list of the years written
+        """
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+        manifest = self.read_manifest()
+        started = self.change_marker()
+        since = None if full or manifest['exported_at'] is None else parse_datetime(manifest['exported_at'])
+        years = self.changed_years(since)
+
+        for year in years:
+            rows = self.year_rows(year)
+            name = PARTITION.format(year=year)
+            self.replace(name, lambda output: np.savez_compressed(output, **to_columns(rows)))
+            manifest['partitions'][str(year)] = {'file': name, 'rows': len(rows)}
+
+        manifest['exported_at'] = started.isoformat()
+        manifest['fields'] = FIELDS
+        self.replace(MANIFEST, lambda output: json.dump(manifest, output, indent=2, sort_keys=True))
+        return years
+
+
+def read_partition(path):
+    """
+    :param path: path to a year partition
+    :return: dict of field name to array
+    """
+    with np.load(path) as partition:
+        return dict((field, partition[field]) for field in partition.files)
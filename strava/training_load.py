@@ -0,0 +1,65 @@
+"""
+Fitness (CTL), fatigue (ATL) and form (TSB) from daily training load, using exponentially weighted moving averages.
+"""
+import math
+
+import numpy as np
+
+CTL_DAYS = 42
+ATL_DAYS = 7
+# closed form EWMAs scale values by decay ** -n, so long histories are worked through in blocks to stay accurate
+BLOCK_DAYS = 128
+
+
+def ewma(loads, days, initial=0.0):
+    """
+    Exponentially weighted moving average of daily loads, vectorised with the closed form of
+    x[t] = x[t - 1] + k * (load[t] - x[t - 1]) where k = 1 - exp(-1 / days)
+    :param loads: array of daily loads, one per consecutive day
+    :param days: time constant in days
+    :param initial: value of the average on the day before the first load
+    :return: array of the average at the end of each day
+    """
+    loads = np.asarray(loads, dtype=np.float64)
+    decay = math.exp(-1.0 / days)
+    gain = 1 - decay
+    result = np.empty_like(loads)
+    previous = float(initial)
+    for start in range(0, len(loads), BLOCK_DAYS):
+        block = loads[start:start + BLOCK_DAYS]
+        steps = np.arange(len(block))
+        powers = decay ** steps
+        result[start:start + len(block)] = decay * powers * previous + gain * powers * np.cumsum(block / powers)
+        previous = result[start + len(block) - 1]
+    return result
+
+
+def daily_loads(dates, loads, start, end):
+    """
+    Spreads loads onto one row per day, adding up days with more than one activity and filling rest days with 0
+    :param dates: datetime64[D] array like of activity dates
+    :param loads: load of each activity (NaN / None counts as 0)
+    :param start: first day (datetime.date)
+    :param end: last day (datetime.date)
+    :return: tuple of (datetime64[D] array of every day from start to end, array of the load on each day)
+    """
+    start, end = np.datetime64(start, 'D'), np.datetime64(end, 'D')
+    days = np.arange(start, end + 1, dtype='datetime64[D]')
+    dates = np.asarray(dates, dtype='datetime64[D]')
+    loads = np.nan_to_num(np.asarray([np.nan if load is None else load for load in loads], dtype=np.float64))
+    in_range = (dates >= start) & (dates <= end)
+    offsets = (dates[in_range] - start).astype(np.int64)
+    return days, np.bincount(offsets, weights=loads[in_range], minlength=len(days))
+
+
+def training_load(loads, initial_ctl=0.0, initial_atl=0.0):
+    """
+    :param loads: array of daily loads, one per consecutive day
+    :param initial_ctl: fitness on the day before the first load
+    :param initial_atl: fatigue on the day before the first load
+    :return: tuple of (ctl, atl, tsb) arrays. Form (tsb) is yesterday's fitness minus yesterday's fatigue.
+    """
+    ctl = ewma(loads, CTL_DAYS, initial_ctl)
+    atl = ewma(loads, ATL_DAYS, initial_atl)
+    tsb = np.concatenate(([initial_ctl - initial_atl], (ctl - atl)[:-1]))[:len(ctl)]
+    return ctl, atl, tsb
@@ -1,15 +1,223 @@
-from strava.models import Strava
+import datetime
+import math
+
+from django.db.models import F, Q
+from rest_framework.exceptions import ValidationError
 from rest_framework.generics import ListAPIView
-from strava.serializers import StravaSerializer
+from rest_framework.pagination import PageNumberPagination
+
+from strava import geo, polyline
+from strava.models import Strava, TrainingLoad, PersonalRecord
+from strava.records import METRICS, ALL_TIME
+from strava.search import SEARCH_FIELD, MATCH_SQL, RANK_SQL
+from strava.serializers import StravaSerializer, RouteSerializer, TrainingLoadSerializer, PersonalRecordSerializer
+
+DEFAULT_MAP_ZOOM = 10
+LATITUDE_RANGE = (-90, 90)
+LONGITUDE_RANGE = (-180, 180)
+# PersonalRecord.year is a SmallIntegerField
+SMALLINT_RANGE = (-32768, 32767)
+
+HAVERSINE_SQL = "2 * %s * asin(sqrt(power(sin(radians(latitude - %s) / 2), 2) + " \
+                "cos(radians(%s)) * cos(radians(latitude)) * power(sin(radians(longitude - %s) / 2), 2))) <= %s"
+
+
+def check_range(name, value, minimum=None, maximum=None):
+    if (minimum is not None and value < minimum) or (maximum is not None and value > maximum):
+        raise ValidationError({name: "A number between {minimum} and {maximum} is required.".format(
+            minimum=minimum, maximum=maximum)})
+    return value
+
+
+def float_param(params, name, minimum=None, maximum=None):
+    """
+    :param minimum: smallest value allowed, if any
+    :param maximum: largest value allowed, if any
+    :return: the parameter as a finite float, or None if it wasn't given
+    """
+    value = params.get(name)
+    if value is None:
+        return None
+    try:
+        value = float(value)
+    except ValueError:
+        raise ValidationError({name: "A number is required."})
+    if math.isnan(value) or math.isinf(value):
+        raise ValidationError({name: "A finite number is required."})
+    return check_range(name, value, minimum, maximum)
+
+
+def int_param(params, name, minimum=None, maximum=None):
+    """
+    :param minimum: smallest value allowed, if any
+    :param maximum: largest value allowed, if any
+    :return: the parameter as an int, or None if it wasn't given
+    """
+    value = params.get(name)
+    if value is None:
+        return None
+    try:
+        value = int(value)
+    except ValueError:
+        raise ValidationError({name: "A whole number is required."})
+    return check_range(name, value, minimum, maximum)
+
+
+def date_param(params, name):
+    value = params.get(name)
+    if value is None:
+        return None
+    try:
+        return datetime.datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        raise ValidationError({name: "A date in the format YYYY-MM-DD is required."})
+
+
+def within_box(queryset, min_lat, min_lng, max_lat, max_lng):
+    """
+    Limits a queryset to activities starting inside a bounding box. The geohash prefixes covering the box let Postgres
+    use the geohash index to only look at the relevant cells, the lat / lng ranges trim the edges of those cells.
+    """
+    cells = Q()
+    for cell in geo.covering_cells(min_lat, min_lng, max_lat, max_lng):
+        cells |= Q(geohash__startswith=cell)
+    return queryset.filter(cells,
+                           latitude__range=(min_lat, max_lat),
+                           longitude__range=(min_lng, max_lng))
+
+
+def within_radius(queryset, latitude, longitude, radius_km):
+    """
+    Limits a queryset to activities starting within radius_km of a point
+    """
+    queryset = within_box(queryset, *geo.bounding_box(latitude, longitude, radius_km))
+    return queryset.extra(where=[HAVERSINE_SQL],
+                          params=[geo.EARTH_RADIUS_KM, latitude, latitude, longitude, radius_km])
+
+
+def search(queryset, text):
+    """
+    Limits a queryset to activities whose name matches the search text, best matches first. The match runs against the
+    GIN indexed search vector rather than scanning the names.
+    """
+    return queryset.extra(select={'search_rank': RANK_SQL}, select_params=[text],
+                          where=[MATCH_SQL], params=[text],
+                          order_by=['-search_rank'])
 
 
 class StravaView(ListAPIView):
     """
     API endpoint for viewing Strava Data.
+
+    Filter by start location with either `lat`, `lng` and `radius_km` (e.g. ?lat=51.5&lng=-0.12&radius_km=5), or a
+    bounding box with `min_lat`, `min_lng`, `max_lat` and `max_lng`.
+
+    Search activity names with `search` (e.g. ?search=ride london), which returns the best matches first.
     """
     model = Strava
     serializer_class = StravaSerializer
 
     def get_queryset(self):
-        queryset = self.model.objects.all()
+        # routes are only needed by the map endpoint and are far bigger than the rest of the row
+        queryset = self.model.objects.defer(SEARCH_FIELD, *[field for field, _, _ in polyline.TIERS])
+        params = self.request.query_params
+
+        text = params.get('search', '').strip()
+        if text:
+            queryset = search(queryset, text)
+
+        point = [float_param(params, 'lat', *LATITUDE_RANGE), float_param(params, 'lng', *LONGITUDE_RANGE),
+                 float_param(params, 'radius_km')]
+        box = [float_param(params, name, *limits) for name, limits in (('min_lat', LATITUDE_RANGE),
+                                                                       ('min_lng', LONGITUDE_RANGE),
+                                                                       ('max_lat', LATITUDE_RANGE),
+                                                                       ('max_lng', LONGITUDE_RANGE))]
+        if any(value is not None for value in point):
+            if any(value is None for value in point):
+                raise ValidationError("lat, lng and radius_km are all required to search around a point.")
+            if point[2] <= 0:
+                raise ValidationError({'radius_km': "A number greater than 0 is required."})
+            queryset = within_radius(queryset, *point)
+        elif any(value is not None for value in box):
+            if any(value is None for value in box):
+                raise ValidationError("min_lat, min_lng, max_lat and max_lng are all required to search a box.")
+            min_lat, min_lng, max_lat, max_lng = box
+            if min_lat > max_lat or min_lng > max_lng:
+                raise ValidationError("min_lat and min_lng can't be more than max_lat and max_lng.")
+            queryset = within_box(queryset, *box)
+        return queryset
+
+
+class RoutePagination(PageNumberPagination):
+    page_size = 500
+
+
+class StravaMapView(StravaView):
+    """
+    API endpoint for drawing routes on a map.
+
+    Returns each activity's route as an encoded polyline, simplified to suit the map's `zoom` level (0 - 20). Takes the
+    same location filters as the activity list.
+    """
+    serializer_class = RouteSerializer
+    pagination_class = RoutePagination
+
+    def get_zoom(self):
+        zoom = float_param(self.request.query_params, 'zoom')
+        return DEFAULT_MAP_ZOOM if zoom is None else zoom
+
+    def get_queryset(self):
+        field = polyline.tier_for_zoom(self.get_zoom())
+        queryset = super(StravaMapView, self).get_queryset()
+        return queryset.filter(**{field + '__isnull': False}) \
+            .annotate(polyline=F(field)) \
+            .order_by('-_date') \
+            .values('activity_id', 'name', 'polyline')
+
+
+class TrainingLoadPagination(PageNumberPagination):
+    page_size = 366
+
+
+class TrainingLoadView(ListAPIView):
+    """
+    API endpoint for daily fitness (ctl), fatigue (atl) and form (tsb), newest first.
+
+    Limit the days returned with `start` and `end` (YYYY-MM-DD).
+    """
+    model = TrainingLoad
+    serializer_class = TrainingLoadSerializer
+    pagination_class = TrainingLoadPagination
+
+    def get_queryset(self):
+        queryset = self.model.objects.order_by('-date')
+        start = date_param(self.request.query_params, 'start')
+        end = date_param(self.request.query_params, 'end')
+        if start:
+            queryset = queryset.filter(date__gte=start)
+        if end:
+            queryset = queryset.filter(date__lte=end)
+        return queryset
+
+
+class PersonalRecordView(ListAPIView):
+    """
+    API endpoint for my top activities by distance_miles, elevation_feet, kilojoules and kudos_count.
+
+    All time by default, or for one `year`. Limit it to one leaderboard with `metric` (e.g. ?metric=distance_miles).
+    """
+    model = PersonalRecord
+    serializer_class = PersonalRecordSerializer
+
+    def get_queryset(self):
+        params = self.request.query_params
+        year = int_param(params, 'year', *SMALLINT_RANGE)
+        queryset = self.model.objects.select_related('activity') \
+            .filter(year=ALL_TIME if year is None else year) \
+            .order_by('metric', 'rank')
+        metric = params.get('metric')
+        if metric is not None:
+            if metric not in METRICS:
+                raise ValidationError({'metric': "One of {metrics} is required.".format(metrics=", ".join(METRICS))})
+            queryset = queryset.filter(metric=metric)
         return queryset
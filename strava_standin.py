@@ -0,0 +1,338 @@
+"""
+Local stand-in for the parts of the Strava API the fetcher uses, for load testing ingestion offline.
+
+Serves /athlete, /athlete/activities, /activities/<id> and /activities/<id>/streams/<types> under /api/v3 with
+deterministic synthetic data, and can add latency, rate limit headers, 429s and 5xx errors.
+
+    $ python strava_standin.py --activities 100000 --latency-ms 50 --error-rate 0.01
+    $ STRAVA_ACCESS_TOKEN=anything STRAVA_API_URL=http://127.0.0.1:8765/api/v3 python cli.py sync
+"""
+import argparse
+import BaseHTTPServer
+import SocketServer
+import datetime
+import gzip
+import json
+import math
+import random
+import re
+import threading
+import time
+import urlparse
+from cStringIO import StringIO
+
+from strava.polyline import encode
+
+API_BASE = '/api/v3'
+NEWEST_START = datetime.datetime(2017, 10, 1, 7, 30)
+ATHLETE_ID = 1234
+RESOLUTIONS = {'low': 100, 'medium': 1000, 'high': 10000}
+CITIES = [('London', 'United Kingdom', 51.5074, -0.1278),
+          ('Richmond', 'United Kingdom', 51.4613, -0.3037),
+          ('Surrey', 'United Kingdom', 51.3148, -0.5600),
+          ('San Francisco', 'United States', 37.7749, -122.4194)]
+
+
+class SyntheticAthlete(object):
+
+    """
+    Deterministic fake athlete. Activity n (1 is the newest) always has the same details for a given seed, and is
+    generated on demand so very large histories cost nothing until they are asked for.
+    """
+
+    def __init__(self, activities=1000, seed=0, spacing_hours=24):
+        self.activities = activities
+        self.seed = seed
+        self.spacing = datetime.timedelta(hours=spacing_hours)
+
+    def random(self, kind, number):
+        return random.Random((self.seed * 1000003 + number) * 2 + kind)
+
+    def athlete(self):
+        return {'id': ATHLETE_ID, 'resource_state': 3, 'firstname': 'Stand', 'lastname': 'In',
+                'follower_count': 42, 'friend_count': 42, 'city': 'London', 'country': 'United Kingdom'}
+
+    def start_date(self, number):
+        return NEWEST_START - (number - 1) * self.spacing
+
+    def number_for_id(self, activity_id):
+        number = activity_id - ATHLETE_ID * 10 ** 6
+        if 1 <= number <= self.activities:
+            return number
+
+    def numbers_between(self, after=None, before=None):
+        """
+        :param after: unix time activities must start after
+        :param before: unix time activities must start before
+        :return: (first, last) activity numbers in range, newest first
+        """
+        seconds = self.spacing.total_seconds()
+        newest = (NEWEST_START - datetime.datetime(1970, 1, 1)).total_seconds()
+        first, last = 1, self.activities
+        if before is not None:
+            first = max(first, int(math.floor((newest - before) / seconds)) + 2)
+        if after is not None:
+            last = min(last, int(math.ceil((newest - after) / seconds)))
+        return first, last
+
+    def route(self, rand, latitude, longitude, points):
+        heading = rand.uniform(0, 2 * math.pi)
+        coordinates = []
+        for _ in range(points):
+            heading += rand.gauss(0, 0.3)
+            latitude += 0.002 * math.cos(heading)
+            longitude += 0.003 * math.sin(heading)
+            coordinates.append((latitude, longitude))
+        return coordinates
+
+    def activity(self, number, detailed=False):
+        rand = self.random(0, number)
+        city, country, latitude, longitude = rand.choice(CITIES)
+        latitude += rand.uniform(-0.05, 0.05)
+        longitude += rand.uniform(-0.05, 0.05)
+        moving_time = rand.randint(1200, 6 * 3600)
+        distance = moving_time * rand.uniform(6, 9)
+        device_watts = rand.random() < 0.6
+        average_watts = round(rand.uniform(120, 280), 1)
+        start = self.start_date(number)
+        activity_id = ATHLETE_ID * 10 ** 6 + number
+        return {
+            'id': activity_id,
+            'resource_state': 3 if detailed else 2,
+            'athlete': {'id': ATHLETE_ID, 'resource_state': 1},
+            'name': rand.choice(['Morning Ride', 'Lunch Ride', 'Evening Ride', 'Ride London', 'Box Hill Reps']),
+            'type': 'Ride',
+            'distance': round(distance, 1),
+            'moving_time': moving_time,
+            'elapsed_time': moving_time + rand.randint(0, 1800),
+            'total_elevation_gain': round(distance * rand.uniform(0.002, 0.02), 1),
+            'start_date': start.strftime('%Y-%m-%dT%H:%M:%SZ'),
+            'start_date_local': start.strftime('%Y-%m-%dT%H:%M:%SZ'),
+            'timezone': '(GMT+00:00) Europe/London',
+            'start_latlng': [round(latitude, 6), round(longitude, 6)],
+            'start_latitude': round(latitude, 6),
+            'start_longitude': round(longitude, 6),
+            'location_city': city,
+            'location_country': country,
+            'kudos_count': rand.randint(0, 30),
+            'total_photo_count': rand.randint(0, 3),
+            'trainer': rand.random() < 0.1,
+            'device_watts': device_watts,
+            'average_watts': average_watts,
+            'kilojoules': round(average_watts * moving_time / 1000.0, 1),
+            'map': {'id': 'a{id}'.format(id=activity_id), 'resource_state': 2,
+                    'summary_polyline': encode(self.route(rand, latitude, longitude, 50))},
+        }
+
+    def activities_page(self, page=1, per_page=30, after=None, before=None):
+        first, last = self.numbers_between(after=after, before=before)
+        start = first + (page - 1) * per_page
+        end = min(start + per_page - 1, last)
+        return [self.activity(number) for number in range(start, end + 1)]
+
+    def streams(self, number, types, resolution='medium'):
+        rand = self.random(1, number)
+        activity = self.activity(number)
+        size = min(activity['moving_time'] // 5, RESOLUTIONS.get(resolution, RESOLUTIONS['medium']))
+        step = activity['moving_time'] / float(size)
+        latitude, longitude = activity['start_latlng']
+        series = {
+            'time': [int(i * step) for i in range(size)],
+            'distance': [round(activity['distance'] * i / size, 1) for i in range(size)],
+            'latlng': [[round(lat, 6), round(lng, 6)] for lat, lng in self.route(rand, latitude, longitude, size)],
+            'altitude': [round(50 + 30 * math.sin(i / 50.0), 1) for i in range(size)],
+            'watts': [int(rand.gauss(activity['average_watts'], 40)) for _ in range(size)],
+            'heartrate': [int(rand.gauss(145, 10)) for _ in range(size)],
+        }
+        return [{'type': name, 'data': series[name], 'series_type': 'distance', 'original_size': size,
+                 'resolution': resolution} for name in types if name in series]
+
+
+class Faults(object):
+
+    """
+    Decides, reproducibly, which requests are slow or fail, and keeps Strava style rate limit usage counts
+    """
+
+    def __init__(self, latency_ms=0, jitter_ms=0, error_rate=0.0, throttle_rate=0.0, short_limit=600,
+                 long_limit=30000, seed=0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.short_limit = short_limit
+        self.long_limit = long_limit
+        self.rand = random.Random(seed)
+        self.lock = threading.Lock()
+        self.window_started = time.time()
+        self.short_usage = 0
+        self.long_usage = 0
+
+    def next_request(self):
+        """
+        :return: tuple of (seconds to wait, status code to fail with or None, rate limit headers)
+        """
+        with self.lock:
+            now = time.time()
+            if now - self.window_started >= 15 * 60:
+                self.window_started = now
+                self.short_usage = 0
+            self.short_usage += 1
+            self.long_usage += 1
+            delay = max(self.latency_ms + self.rand.uniform(-self.jitter_ms, self.jitter_ms), 0) / 1000.0
+            roll = self.rand.random()
+            over_limit = self.short_usage > self.short_limit or self.long_usage > self.long_limit
+            headers = {'X-RateLimit-Limit': '{0},{1}'.format(self.short_limit, self.long_limit),
+                       'X-RateLimit-Usage': '{0},{1}'.format(self.short_usage, self.long_usage)}
+            if over_limit or roll < self.throttle_rate:
+                return delay, 429, headers
+            if roll < self.throttle_rate + self.error_rate:
+                return delay, self.rand.choice([500, 502, 503]), headers
+        return delay, None, headers
+
+
+ERROR_MESSAGES = {401: 'Authorization Error', 404: 'Record Not Found', 429: 'Rate Limit Exceeded',
+                  500: 'Internal Server Error', 502: 'Bad Gateway', 503: 'Service Unavailable'}
+
+
+class StandInHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+    routes = [(re.compile(r'^/athlete$'), 'get_athlete'),
+              (re.compile(r'^/athlete/activities$'), 'get_activities'),
+              (re.compile(r'^/activities/(\d+)$'), 'get_activity'),
+              (re.compile(r'^/activities/(\d+)/streams/([\w,]+)$'), 'get_streams')]
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            BaseHTTPServer.BaseHTTPRequestHandler.log_message(self, format, *args)
+
+    def setup(self):
+        BaseHTTPServer.BaseHTTPRequestHandler.setup(self)
+        with self.server.connection_lock:
+            self.server.connection_count += 1
+
+    def send_json(self, status, body, headers=None):
+        payload = json.dumps(body)
+        compress = 'gzip' in self.headers.get('Accept-Encoding', '')
+        if compress:
+            buffer = StringIO()
+            with gzip.GzipFile(fileobj=buffer, mode='wb') as compressed:
+                compressed.write(payload)
+            payload = buffer.getvalue()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(payload)))
+        if compress:
+            self.send_header('Content-Encoding', 'gzip')
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def send_error_json(self, status, headers=None):
+        message = ERROR_MESSAGES.get(status, 'Error')
+        self.send_json(status, {'message': message, 'errors': [{'resource': 'Application', 'code': str(status)}]},
+                       headers)
+
+    def do_GET(self):
+        url = urlparse.urlsplit(self.path)
+        params = dict((key, values[-1]) for key, values in urlparse.parse_qs(url.query).items())
+        path = url.path[len(API_BASE):] if url.path.startswith(API_BASE) else None
+
+        delay, failure, headers = self.server.faults.next_request()
+        if delay:
+            time.sleep(delay)
+        if failure:
+            return self.send_error_json(failure, headers)
+        if not params.get('access_token'):
+            return self.send_error_json(401, headers)
+
+        for pattern, method in self.routes:
+            match = pattern.match(path or '')
+            if match:
+                return getattr(self, method)(params, headers, *match.groups())
+        self.send_error_json(404, headers)
+
+    def get_athlete(self, params, headers):
+        self.send_json(200, self.server.athlete.athlete(), headers)
+
+    def get_activities(self, params, headers):
+        per_page = min(int(params.get('per_page', 30)), 200)
+        page = max(int(params.get('page', 1)), 1)
+        after = float(params['after']) if params.get('after') else None
+        before = float(params['before']) if params.get('before') else None
+        self.send_json(200, self.server.athlete.activities_page(page, per_page, after=after, before=before), headers)
+
+    def get_activity(self, params, headers, activity_id):
+        number = self.server.athlete.number_for_id(int(activity_id))
+        if number is None:
+            return self.send_error_json(404, headers)
+        self.send_json(200, self.server.athlete.activity(number, detailed=True), headers)
+
+    def get_streams(self, params, headers, activity_id, types):
+        number = self.server.athlete.number_for_id(int(activity_id))
+        if number is None:
+            return self.send_error_json(404, headers)
+        streams = self.server.athlete.streams(number, types.split(','), params.get('resolution', 'medium'))
+        self.send_json(200, streams, headers)
+
+
+class StandInServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address, athlete, faults, verbose=False):
+        BaseHTTPServer.HTTPServer.__init__(self, address, StandInHandler)
+        self.athlete = athlete
+        self.faults = faults
+        self.verbose = verbose
+        # TCP connections accepted so far, which stays low when clients use keep-alive
+        self.connection_count = 0
+        self.connection_lock = threading.Lock()
+
+    @property
+    def api_url(self):
+        host, port = self.server_address[:2]
+        return 'http://{host}:{port}{base}'.format(host=host, port=port, base=API_BASE)
+
+    def start_in_background(self):
+        thread = threading.Thread(target=self.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return thread
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Local stand-in for the Strava API")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--activities', type=int, default=1000, help="Number of synthetic activities")
+    parser.add_argument('--seed', type=int, default=0, help="Seed for the synthetic data and faults")
+    parser.add_argument('--latency-ms', type=float, default=0, help="Added latency per request")
+    parser.add_argument('--jitter-ms', type=float, default=0, help="Random +/- variation on the latency")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Fraction of requests failing with a 5xx")
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help="Fraction of requests failing with a 429")
+    parser.add_argument('--short-limit', type=int, default=600, help="Requests allowed per 15 minutes")
+    parser.add_argument('--long-limit', type=int, default=30000, help="Requests allowed per day")
+    parser.add_argument('--verbose', action='store_true', default=False, help="Log every request")
+    return parser
+
+
+def build_server(args):
+    faults = Faults(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, error_rate=args.error_rate,
+                    throttle_rate=args.throttle_rate, short_limit=args.short_limit, long_limit=args.long_limit,
+                    seed=args.seed)
+    athlete = SyntheticAthlete(activities=args.activities, seed=args.seed)
+    return StandInServer((args.host, args.port), athlete, faults, verbose=args.verbose)
+
+
+if __name__ == '__main__':
+    server = build_server(build_parser().parse_args())
+    print "Strava stand-in serving {count} activities at {url}".format(count=server.athlete.activities,
+                                                                       url=server.api_url)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
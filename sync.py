@@ -0,0 +1,154 @@
+import datetime
+import fcntl
+import random
+import signal
+import threading
+import time
+
+from activities import ActivityBatch
+from strava.profiling import Profiler
+
+DEFAULT_INTERVAL = 15 * 60
+DEFAULT_JITTER = 60
+DEFAULT_LOCK_FILE = '/tmp/strava_sync.lock'
+
+
+class SyncLocked(Exception):
+    pass
+
+
+class SyncLock(object):
+
+    """
+    Non blocking file lock so two syncs (e.g. a cron run and the daemon) never overlap
+    """
+
+    def __init__(self, path=DEFAULT_LOCK_FILE):
+        self.path = path
+        self.lock_file = None
+
+    def __enter__(self):
+        self.lock_file = open(self.path, 'a')
+        try:
+            fcntl.flock(self.lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except IOError:
+            self.lock_file.close()
+            self.lock_file = None
+            raise SyncLocked("Another sync is holding {path}".format(path=self.path))
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        fcntl.flock(self.lock_file, fcntl.LOCK_UN)
+        self.lock_file.close()
+        self.lock_file = None
+
+
+class StravaSync(object):
+
+    """
+    Class which runs incremental syncs from the Strava API into our Postgres table, either once or on an interval.
+    The API client (and its keep-alive session) and DB connection are made once and kept warm between cycles.
+    """
+
+    def __init__(self, connector, db, update_fields, interval=DEFAULT_INTERVAL, jitter=DEFAULT_JITTER,
+                 lock_path=DEFAULT_LOCK_FILE, profile_dir=None):
+        """
+        :param connector: data_fetcher.StravaConnector instance
+        :param db: data_fetcher.DBConnection instance (ideally persistent)
+        :param update_fields: fields to update when an activity we already have is fetched again
+        :param interval: seconds between the start of each sync
+        :param jitter: maximum random seconds added to each interval
+        :param lock_path: file used to stop overlapping syncs
+        :param profile_dir: if set, each sync writes a profile of its fetch, transform and load stages here
+        """
+        self.connector = connector
+        self.db = db
+        self.update_fields = update_fields
+        self.interval = interval
+        self.jitter = jitter
+        self.lock = SyncLock(lock_path)
+        self.profile_dir = profile_dir
+        self.stopping = threading.Event()
+        self._client = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = self.connector.get_connection()
+        return self._client
+
+    def get_start_from(self):
+        """
+        Strava only gives us a date filter on start time, so we start from midnight of the latest day we hold and let
+        the upsert take care of the activities we already have
+        :return: datetime to sync from, or None for a full sync
+        """
+        latest = self.db.get_latest_activity_date()
+        if latest is None:
+            return None
+        return datetime.datetime.combine(latest, datetime.time())
+
+    def run_once(self):
+        """
+        Runs a single incremental sync
+        :return: number of rows upserted, or None if another sync was already running
+        """
+        try:
+            with self.lock:
+                try:
+                    return self.sync()
+                finally:
+                    print "{calls} Strava API calls".format(calls=self.connector.take_call_count())
+        except SyncLocked as e:
+            print "Skipping sync: {error}".format(error=e)
+
+    def sync(self):
+        """
+        Fetches, transforms and loads everything since the latest activity we hold, profiling each stage if asked to
+        :return: number of rows upserted
+        """
+        profiler = Profiler(self.profile_dir, run_name=datetime.datetime.now().strftime('sync-%Y%m%d-%H%M%S'))
+        with profiler.stage('fetch'):
+            rides = self.connector.fetch_activities(after=self.get_start_from(), conn=self.client)
+        if not rides:
+            print "No new activities found"
+            return 0
+        with profiler.stage('transform'):
+            activities = ActivityBatch.from_activities(rides)
+        with profiler.stage('load'):
+            rows = self.db.insert_data(data=activities, update_fields=self.update_fields)
+        if profiler.enabled:
+            print profiler.report()
+        return rows
+
+    def next_wait(self):
+        return self.interval + random.uniform(0, self.jitter)
+
+    def run_forever(self):
+        """
+        Runs syncs on an interval until we're told to stop. A failed sync is reported and retried on the next cycle.
+        """
+        while not self.stopping.is_set():
+            started = time.time()
+            try:
+                self.run_once()
+            except Exception as e:
+                print "Sync failed: {error}".format(error=e)
+                self.connector.reset()
+                self._client = None
+                self.db.close()
+            wait = max(self.next_wait() - (time.time() - started), 0)
+            self.stopping.wait(wait)
+        self.db.close()
+        print "Sync daemon stopped"
+
+    def stop(self, signum=None, frame=None):
+        """
+        Signal handler which lets the current sync finish and then exits the loop
+        """
+        print "Received signal {signum}, stopping after the current sync...".format(signum=signum)
+        self.stopping.set()
+
+    def install_signal_handlers(self):
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
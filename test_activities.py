@@ -0,0 +1,109 @@
+import datetime
+import mock
+import numpy
+import activities
+
+
+def make_activity(**kwargs):
+    values = dict(id=1,
+                  start_date=datetime.datetime(2017, 1, 1),
+                  distance=mock.MagicMock(get_num=mock.MagicMock(return_value=1609.344)),
+                  device_watts=True,
+                  average_watts=250.0,
+                  moving_time=datetime.timedelta(hours=1),
+                  elapsed_time=datetime.timedelta(hours=1, minutes=5),
+                  kudos_count=5,
+                  total_elevation_gain=mock.MagicMock(get_num=mock.MagicMock(return_value=100)),
+                  kilojoules=900.0,
+                  location_country='United Kingdom',
+                  location_city='London',
+                  start_latitude=51.5,
+                  start_longitude=-0.12,
+                  trainer=False,
+                  total_photo_count=0,
+                  map=None)
+    values.update(kwargs)
+    activity = mock.MagicMock(**values)
+    activity.configure_mock(name='Ride')
+    return activity
+
+
+def test_metres_to_miles():
+    assert numpy.allclose(activities.metres_to_miles(numpy.array([1609.344, 0])), [1, 0], atol=1e-5)
+
+
+def test_metres_to_feet():
+    assert numpy.allclose(activities.metres_to_feet(numpy.array([1.0])), [3.28084])
+
+
+def test_timedeltas_to_seconds():
+    seconds = activities.timedeltas_to_seconds([datetime.timedelta(minutes=1, microseconds=500000), None])
+    assert seconds[0] == 60.5
+    assert numpy.isnan(seconds[1])
+
+
+def test_real_watts():
+    watts = activities.real_watts([True, False, None], numpy.array([200.0, 150.0, numpy.nan]))
+    assert watts[0] == 200
+    assert numpy.isnan(watts[1]) and numpy.isnan(watts[2])
+
+
+def test_quantities_to_array():
+    quantities = [mock.MagicMock(get_num=mock.MagicMock(return_value=10)), 5, None]
+    assert numpy.array_equal(activities.quantities_to_array(quantities)[:2], [10, 5])
+    assert numpy.isnan(activities.quantities_to_array(quantities)[2])
+
+
+def test_from_activities():
+    batch = activities.ActivityBatch.from_activities([make_activity(),
+                                                      make_activity(id=2, device_watts=False, kilojoules=None)])
+    assert len(batch) == 2
+    assert numpy.allclose(batch['distance_miles'], 1, atol=1e-5)
+    assert batch['moving_time_seconds'][0] == 3600
+    assert batch['avg_power'][0] == 250 and numpy.isnan(batch['avg_power'][1])
+    assert batch.fields[:3] == ['activity_id', 'name', '_date']
+
+
+def test_rows_use_none_for_missing_values():
+    batch = activities.ActivityBatch.from_activities([make_activity(device_watts=False, start_latitude=None)])
+    row = list(batch)[0]
+    assert row[batch.fields.index('avg_power')] is None
+    assert row[batch.fields.index('latitude')] is None
+    assert row[batch.fields.index('_date')] == datetime.date(2017, 1, 1)
+    assert type(row[batch.fields.index('activity_id')]) in (int, long)
+
+
+def test_empty_batch():
+    batch = activities.ActivityBatch.from_activities([])
+    assert len(batch) == 0
+    assert list(batch) == []
+    assert batch.first_date() is None
+    assert batch.total('distance_miles') == 0
+
+
+def test_dates():
+    batch = activities.ActivityBatch.from_activities([make_activity(start_date=datetime.datetime(2016, 5, 1)),
+                                                      make_activity(start_date=datetime.datetime(2017, 5, 1))])
+    assert batch.first_date() == datetime.date(2016, 5, 1)
+    assert batch.last_date() == datetime.date(2017, 5, 1)
+
+
+def test_from_activities_geohash():
+    batch = activities.ActivityBatch.from_activities([make_activity(), make_activity(start_latitude=None)])
+    assert batch['geohash'][0] == 'gcpuvr295'
+    assert batch['geohash'][1] is None
+
+
+def test_from_activities_polyline_tiers():
+    route = mock.MagicMock(summary_polyline='_p~iF~ps|U_ulLnnqC_mqNvxq`@')
+    batch = activities.ActivityBatch.from_activities([make_activity(map=route), make_activity()])
+    assert batch['summary_polyline'][0] == route.summary_polyline
+    assert batch['polyline_low'][0] is not None
+    assert batch['polyline_low'][1] is None
+
+
+def test_rows_use_whole_seconds():
+    batch = activities.ActivityBatch.from_activities([make_activity(moving_time=datetime.timedelta(seconds=59.6))])
+    row = list(batch)[0]
+    moving_time = row[batch.fields.index('moving_time_seconds')]
+    assert moving_time == 60 and isinstance(moving_time, (int, long))
@@ -0,0 +1,91 @@
+import mock
+import pytest
+import cache
+
+
+@pytest.fixture
+def disk_cache(tmpdir):
+    return cache.TTLCache(ttl=10, stale_ttl=100, max_size=2, path=str(tmpdir.join('cache')))
+
+
+def test_get_missing(disk_cache):
+    assert disk_cache.get('missing') is None
+
+
+def test_set_and_get(disk_cache):
+    disk_cache.set('key', {'a': 1})
+    assert disk_cache.get('key') == {'a': 1}
+
+
+def test_lru_eviction_falls_back_to_disk(disk_cache):
+    for key in ('a', 'b', 'c'):
+        disk_cache.set(key, key)
+    assert list(disk_cache.memory) == ['b', 'c']
+    assert disk_cache.get('a') == 'a'
+    assert list(disk_cache.memory) == ['c', 'a']
+
+
+def test_persists_between_instances(disk_cache):
+    disk_cache.set('key', 'value')
+    assert cache.TTLCache(path=disk_cache.path).get('key') == 'value'
+
+
+def test_expired_entries_are_not_fresh(disk_cache):
+    with mock.patch('cache.time.time', return_value=0):
+        disk_cache.set('key', 'value')
+    with mock.patch('cache.time.time', return_value=11):
+        assert disk_cache.get('key') is None
+
+
+def test_get_or_fetch_fetches_once(disk_cache):
+    fetch = mock.MagicMock(return_value='value')
+    assert disk_cache.get_or_fetch('key', fetch) == 'value'
+    assert disk_cache.get_or_fetch('key', fetch) == 'value'
+    assert fetch.call_count == 1
+
+
+def test_get_or_fetch_serves_stale_and_refreshes(disk_cache):
+    with mock.patch('cache.time.time', return_value=0):
+        disk_cache.set('key', 'old')
+    fetch = mock.MagicMock(return_value='new')
+    # the clock stays frozen until the background refresh has written its entry, or the entry looks ancient
+    with mock.patch('cache.time.time', return_value=50):
+        assert disk_cache.get_or_fetch('key', fetch) == 'old'
+        for _ in range(100):
+            if not disk_cache.refreshing:
+                break
+            cache.time.sleep(0.01)
+        assert disk_cache.get('key') == 'new'
+
+
+def test_get_or_fetch_refetches_when_too_stale(disk_cache):
+    with mock.patch('cache.time.time', return_value=0):
+        disk_cache.set('key', 'old')
+    with mock.patch('cache.time.time', return_value=101):
+        assert disk_cache.get_or_fetch('key', lambda: 'new') == 'new'
+
+
+def test_failed_refresh_keeps_stale_value(disk_cache):
+    disk_cache.set('key', 'old')
+    disk_cache.refreshing.add('key')
+    disk_cache.refresh('key', mock.MagicMock(side_effect=Exception))
+    assert disk_cache.get_entry('key')[1] == 'old'
+    assert not disk_cache.refreshing
+
+
+def test_get_or_fetch_refreshes_in_foreground(tmpdir):
+    foreground = cache.TTLCache(ttl=10, stale_ttl=100, path=str(tmpdir.join('cache')), background=False)
+    with mock.patch('cache.time.time', return_value=0):
+        foreground.set('key', 'old')
+    with mock.patch('cache.time.time', return_value=50):
+        with mock.patch.object(foreground, 'refresh_in_background') as background_mocker:
+            assert foreground.get_or_fetch('key', lambda: 'new') == 'new'
+    assert not background_mocker.called
+
+
+def test_disk_writes_hold_an_exclusive_lock(disk_cache):
+    with mock.patch('cache.fcntl.flock') as flock_mocker:
+        disk_cache.set('key', 'value')
+        disk_cache._read_disk('key')
+    operations = [call[0][1] for call in flock_mocker.call_args_list]
+    assert operations == [cache.fcntl.LOCK_EX, cache.fcntl.LOCK_UN, cache.fcntl.LOCK_SH, cache.fcntl.LOCK_UN]
@@ -0,0 +1,82 @@
+import subprocess
+import sys
+import mock
+import cli
+import data_fetcher
+
+
+def test_import_does_not_load_heavy_modules():
+    code = "import sys, cli; print(','.join(m for m in ('django', 'stravalib', 'psycopg2', 'requests') if m in sys.modules))"
+    assert subprocess.check_output([sys.executable, '-c', code]).strip() == ''
+
+
+def test_data_fetcher_import_does_not_setup_django():
+    code = "import sys, data_fetcher; print('django.apps.registry' in sys.modules)"
+    assert subprocess.check_output([sys.executable, '-c', code]).strip() == 'False'
+
+
+def test_parser_sync_defaults():
+    args = cli.build_parser().parse_args(['sync'])
+    assert args.func == cli.run_sync
+    assert args.config == 'config.conf'
+    assert args.section == 'local'
+
+
+def test_parser_weather_city_id():
+    args = cli.build_parser().parse_args(['weather', '--city-id', '100'])
+    assert args.func == cli.run_weather
+    assert args.city_id == 100
+
+
+@mock.patch('weather.Weather')
+def test_run_weather_uses_default_city(weather_mocker):
+    weather_mocker.return_value.build_weather_dict.return_value = {'city_name': 'London'}
+    cli.main(['weather', '--no-cache'])
+    weather_mocker.assert_called_with(city_id=None, use_default=True, cache=None)
+
+
+@mock.patch('weather.default_cache')
+@mock.patch('weather.Weather')
+def test_run_weather_refreshes_cache_in_foreground(weather_mocker, cache_mocker):
+    weather_mocker.return_value.build_weather_dict.return_value = {}
+    cli.main(['weather'])
+    cache_mocker.assert_called_with(background=False)
+    weather_mocker.assert_called_with(city_id=None, use_default=True, cache=cache_mocker.return_value)
+
+
+@mock.patch('activities.ActivityBatch.from_activities')
+@mock.patch('data_fetcher.summary_printout')
+@mock.patch('data_fetcher.DBConnection')
+@mock.patch('data_fetcher.StravaConnector')
+def test_run_sync(connector_mocker, db_mocker, summary_mocker, batch_mocker):
+    cli.main(['sync', '--section', 'test'])
+    batch_mocker.assert_called_with(connector_mocker.return_value.fetch_activities.return_value)
+    activities = batch_mocker.return_value
+    db_mocker.assert_called_with('config.conf', 'test')
+    db_mocker.return_value.insert_data.assert_called_with(data=activities, update_fields=data_fetcher.UPDATE_FIELDS)
+
+
+def test_run_export_writes_only_activity_columns(tmpdir):
+    from datawarehouse import setup_django
+    setup_django()
+    from strava.models import Strava, PersonalRecord
+    assert PersonalRecord._meta.get_field('activity').related_model is Strava
+    output = tmpdir.join('activities.csv')
+    with mock.patch.object(Strava, 'objects') as objects_mocker:
+        values_list = objects_mocker.order_by.return_value.values_list
+        values_list.return_value.iterator.return_value = iter([(1, u'Caf\xe9 ride')])
+        cli.main(['export', '--output', str(output)])
+    fields = values_list.call_args[0]
+    assert 'personalrecord' not in fields
+    assert 'name_search' not in fields
+    assert 'updated_at' not in fields
+    assert output.read('rb').splitlines() == [','.join(fields), '1,Caf\xc3\xa9 ride']
+
+
+def test_field_names_leave_out_reverse_relations():
+    from datawarehouse import setup_django
+    setup_django()
+    from strava.models import Strava
+    fields = data_fetcher.DBConnection.get_field_names(Strava)
+    assert 'personalrecord' not in fields
+    assert fields == [field.column for field in Strava._meta.concrete_fields]
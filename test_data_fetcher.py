@@ -1,6 +1,8 @@
 import pytest
 import mock
+import numpy
 import data_fetcher
+import activities
 import datetime
 
 API_KEY_MOCKER = {'STRAVA_ACCESS_TOKEN': 'ABC123'}
@@ -29,17 +31,70 @@ def test_get_access_token_with_raw_input(connector, API_KEY='Manually Entered AP
         assert connector.get_access_token() == API_KEY
 
 
+@mock.patch("os.environ", {})
+def test_get_access_token_non_interactive(connector):
+    with pytest.raises(ValueError):
+        connector.get_access_token(interactive=False)
+
+
+def test_connector_with_token():
+    assert data_fetcher.StravaConnector(token='ABC123').token == 'ABC123'
+
+
 @mock.patch('data_fetcher.Client')
 def test_get_connection(mocked_client, connector_with_key):
-    mocked_client.return_value.protocol.get.return_value = {}
     assert connector_with_key.get_connection() == mocked_client()
 
 
+@mock.patch('data_fetcher.Client')
+def test_get_connection_is_shared(mocked_client, connector_with_key):
+    assert connector_with_key.get_connection() is connector_with_key.get_connection()
+    assert mocked_client.call_count == 1
+    assert mocked_client.return_value.get_athlete.call_count == 1
+
+
 @mock.patch('data_fetcher.Client')
 def test_get_connection_throws_exception(mocked_client, connector_with_key):
-    mocked_client.return_value.protocol.get = mock.MagicMock(side_effect=Exception)
+    mocked_client.return_value.get_athlete = mock.MagicMock(side_effect=Exception)
     with pytest.raises(Exception):
         connector_with_key.get_connection()
+    assert connector_with_key._client is None
+
+
+@mock.patch('data_fetcher.Client')
+def test_reset_reconnects(mocked_client, connector_with_key):
+    connector_with_key.get_connection()
+    connector_with_key.reset()
+    connector_with_key.get_connection()
+    assert mocked_client.call_count == 2
+
+
+@mock.patch('data_fetcher.Client')
+def test_get_athlete_reuses_auth_check(mocked_client, connector_with_key):
+    athlete = connector_with_key.get_athlete()
+    assert athlete == mocked_client.return_value.get_athlete.return_value
+    connector_with_key.get_athlete()
+    assert mocked_client.return_value.get_athlete.call_count == 1
+
+
+@mock.patch('data_fetcher.time.time')
+@mock.patch('data_fetcher.Client')
+def test_get_athlete_expires(mocked_client, time_mocker, connector_with_key):
+    time_mocker.return_value = 1000
+    connector_with_key.get_athlete()
+    time_mocker.return_value = 1000 + data_fetcher.ATHLETE_TTL + 1
+    connector_with_key.get_athlete()
+    assert mocked_client.return_value.get_athlete.call_count == 2
+
+
+def test_build_session_counts_calls(connector_with_key):
+    session = connector_with_key.build_session()
+    assert 'gzip' in session.headers['Accept-Encoding']
+    for hook in session.hooks['response']:
+        hook(mock.MagicMock())
+        hook(mock.MagicMock())
+    assert connector_with_key.take_call_count() == 2
+    assert connector_with_key.take_call_count() == 0
 
 
 @mock.patch('data_fetcher.StravaConnector.get_connection')
@@ -52,41 +107,34 @@ def test_get_details(mocked_connection, connector_with_key):
                                                 }
 
 
-@mock.patch('data_fetcher.StravaConnector.metres_to_feet')
-@mock.patch('data_fetcher.StravaConnector.time_in_seconds')
-@mock.patch('data_fetcher.StravaConnector.real_watts')
-@mock.patch('data_fetcher.StravaConnector.distance_converter')
 @mock.patch('data_fetcher.StravaConnector.get_connection')
-def test_get_activities(mocked_connection, mocked_converter, mocked_watts, mocked_time_seconds, mocked_metres,
-                        connector_with_key):
-
-    mocked_converter.return_value = 100
-    mocked_watts.return_value = 100
-    mocked_time_seconds.return_value = 100
-    mocked_metres.return_value = 100
+def test_get_activities(mocked_connection, connector_with_key):
     mocked_activity = mock.MagicMock(
         id=1,
-        name='Ride',
         start_date=datetime.datetime(2017, 1, 1),
-        distance=100,
+        distance=1000,
         device_watts=True,
         average_watts=300,
-        moving_time=100,
-        elapsed_time=100,
+        moving_time=datetime.timedelta(seconds=100),
+        elapsed_time=datetime.timedelta(seconds=120),
         kudos_count=10,
         total_elevation_gain=100,
         kilojoules=100,
         location_country='USA',
         location_city='San Francisco',
-        start_longitude='50',
-        start_latitude='50',
+        start_longitude=-122.4,
+        start_latitude=37.8,
         trainer=False,
-        total_photo_count=10
+        total_photo_count=10,
+        map=None
     )
     mocked_activity.configure_mock(name='Ride')
     mocked_connection.return_value.get_activities.return_value = [mocked_activity]
-    assert connector_with_key.get_activities() == [
-        (1, 'Ride', '2017-01-01', 100, 100, 100, 100, 10, 100, 100, 'USA', 'San Francisco', '50', '50', False, 10),
+    activities = connector_with_key.get_activities()
+    mocked_connection.return_value.get_activities.assert_called_with(after=None)
+    assert list(activities) == [
+        (1, 'Ride', datetime.date(2017, 1, 1), 1000 * 0.000621371, 300.0, 100.0, 120.0, 10, 100 * 3.28084, 100.0,
+         'USA', 'San Francisco', 37.8, -122.4, '9q8zn9r0c', False, 10, None, None, None),
     ]
 
 
@@ -113,6 +161,23 @@ def test_connect(mocked_connection, mocked_config, get_db_connection):
     mocked_connection.assert_called_with(**config)
 
 
+@mock.patch('data_fetcher.DBConnection.get_config_details')
+@mock.patch('data_fetcher.psycopg2.connect')
+def test_connect_persistent(mocked_connection, mocked_config):
+    db = data_fetcher.DBConnection(config='Test', section='Test', persistent=True)
+    mocked_connection.return_value.closed = 0
+    assert db.connect() is db.connect()
+    assert mocked_connection.call_count == 1
+    db.close()
+    mocked_connection.return_value.close.assert_called_with()
+
+
+@mock.patch('data_fetcher.DBConnection.fetch_all')
+def test_get_latest_activity_date(fetch_mocker, get_db_connection):
+    fetch_mocker.return_value = [(datetime.date(2017, 1, 1),)]
+    assert get_db_connection.get_latest_activity_date() == datetime.date(2017, 1, 1)
+
+
 @mock.patch('data_fetcher.DBConnection.connect')
 def test_execute_sql(connect_mocker, get_db_connection):
     conn = connect_mocker.return_value.__enter__()
@@ -121,11 +186,11 @@ def test_execute_sql(connect_mocker, get_db_connection):
     cursor.execute.assert_called_with('TEST')
 
 
-@mock.patch('data_fetcher.Strava')
-def test_get_field_names(mocked_model, get_db_connection, name='Test'):
+def test_get_field_names(get_db_connection, name='Test'):
+    mocked_model = mock.MagicMock()
     field = mock.MagicMock()
-    field.configure_mock(name=name)
-    mocked_model._meta.get_fields.return_value = [field, ]
+    field.configure_mock(column=name)
+    mocked_model._meta.concrete_fields = [field, ]
     assert get_db_connection.get_field_names(mocked_model) == [name]
 
 
@@ -139,10 +204,149 @@ def test_insert_data(field_names_mocker, holders_mocker, execute_mocker, get_db_
     holders = '%s'
     field_names_mocker.return_value = fields
     holders_mocker.return_value = holders
-    fields_to_update = ", ".join("{field}=excluded.{field}".format(field=field) for field in update_fields)
-    sql = """insert into {table_name} ({fields}) values ({holders}) on conflict (activity_id) do update set {update_columns}""".format(
+    fields_to_update = ", ".join("{field}=excluded.{field}".format(field=field) for field in update_fields + ['updated_at'])
+    sql = """insert into {table_name} ({fields},updated_at) values ({holders},clock_timestamp()) on conflict (activity_id) do update set {update_columns} where (Test.kudos) is distinct from (excluded.kudos)""".format(
         table_name=get_db_connection.table, fields=",".join(fields), holders=holders, update_columns=fields_to_update
     )
-    data = ''
+    data = [('Test',)]
     get_db_connection.insert_data(data=data, update_fields=update_fields)
-    execute_mocker.assert_called_with(sql=sql, data=data, executemany=True)
\ No newline at end of file
+    execute_mocker.assert_called_with(sql=sql, data=data, executemany=True)
+
+
+@mock.patch('data_fetcher.DBConnection.execute_sql')
+def test_insert_data_with_batch(execute_mocker, get_db_connection):
+    batch = activities.ActivityBatch.empty()
+    get_db_connection.insert_data(data=batch, update_fields=['name'])
+    sql = execute_mocker.call_args[1]['sql']
+    assert sql.startswith("insert into strava_strava ({fields},name_search,updated_at) ".format(
+        fields=",".join(batch.fields)))
+    assert ",to_tsvector('english', %s),clock_timestamp()) on conflict" in sql
+    assert "do update set name=excluded.name, name_search=excluded.name_search, updated_at=excluded.updated_at " in sql
+
+
+@mock.patch('data_fetcher.DBConnection.execute_sql')
+def test_insert_data_leaves_unchanged_rows_alone(execute_mocker, get_db_connection):
+    get_db_connection.insert_data(data=activities.ActivityBatch.empty(), update_fields=['name', 'kudos_count'])
+    sql = execute_mocker.call_args[1]['sql']
+    # re-fetching an activity which hasn't changed mustn't bump updated_at, or every sync would look like new data
+    assert sql.endswith("where (strava_strava.name, strava_strava.kudos_count) "
+                        "is distinct from (excluded.name, excluded.kudos_count)")
+
+
+@mock.patch('data_fetcher.DBConnection.update_records')
+@mock.patch('data_fetcher.DBConnection.update_training_load')
+@mock.patch('data_fetcher.DBConnection.execute_sql')
+def test_insert_data_copies_name_for_search(execute_mocker, training_load_mocker, records_mocker, get_db_connection):
+    batch = activities.ActivityBatch(numpy.zeros(1, dtype=activities.ACTIVITY_DTYPE))
+    batch.data['name'] = ['Ride London']
+    get_db_connection.insert_data(data=batch, update_fields=['kudos_count'])
+    row, = list(execute_mocker.call_args[1]['data'])
+    assert len(row) == len(batch.fields) + 1
+    assert row[batch.fields.index('name')] == row[-1] == 'Ride London'
+    assert 'name_search=excluded' not in execute_mocker.call_args[1]['sql']
+
+
+def test_summary_printout():
+    batch = activities.ActivityBatch.empty()
+    batch.data = numpy.zeros(2, dtype=activities.ACTIVITY_DTYPE)
+    batch.data['_date'] = ['2017-01-01', '2017-02-01']
+    batch.data['distance_miles'] = [10.5, 20.5]
+    batch.data['kilojoules'] = [500, numpy.nan]
+    message = data_fetcher.summary_printout({'first_name': 'Aaron', 'last_name': 'Olszewski', 'followers': 200}, batch)
+    assert "recorded 2 activities between 2017-01-01 and 2017-02-01" in message
+    assert "Cycled 31 miles" in message
+    assert "Burned 500 calories" in message
+
+
+@mock.patch('data_fetcher.DBConnection.update_records')
+@mock.patch('data_fetcher.DBConnection.update_training_load')
+@mock.patch('data_fetcher.DBConnection.execute_sql')
+def test_insert_data_updates_training_load(execute_mocker, training_load_mocker, records_mocker, get_db_connection):
+    batch = activities.ActivityBatch(numpy.zeros(2, dtype=activities.ACTIVITY_DTYPE))
+    batch.data['_date'] = ['2017-02-01', '2017-01-01']
+    get_db_connection.insert_data(data=batch, update_fields=['name'])
+    training_load_mocker.assert_called_with(since=datetime.date(2017, 1, 1))
+
+
+@mock.patch('data_fetcher.DBConnection.update_records')
+@mock.patch('data_fetcher.DBConnection.update_training_load')
+@mock.patch('data_fetcher.DBConnection.execute_sql')
+def test_insert_data_updates_records(execute_mocker, training_load_mocker, records_mocker, get_db_connection):
+    batch = activities.ActivityBatch(numpy.zeros(2, dtype=activities.ACTIVITY_DTYPE))
+    batch.data['activity_id'] = [7, 8]
+    get_db_connection.insert_data(data=batch, update_fields=['name'])
+    records_mocker.assert_called_with(activity_ids=[7, 8])
+
+
+def written_activity(activity_id, day, distance=None, elevation=None, kilojoules=None, kudos=None):
+    return (activity_id, day, distance, elevation, kilojoules, kudos)
+
+
+@mock.patch('data_fetcher.DBConnection.connect')
+@mock.patch('data_fetcher.DBConnection.fetch_all')
+def test_update_records_rewrites_changed_leaderboards(fetch_mocker, connect_mocker, get_db_connection):
+    day = datetime.date(2017, 5, 1)
+    fetch_mocker.side_effect = [[written_activity(2, day, distance=120.0)],
+                                [('distance_miles', 0, 100.0, 1, datetime.date(2016, 5, 1))]]
+    assert get_db_connection.update_records(activity_ids=[2]) == 2
+    cursor = connect_mocker.return_value.__enter__.return_value.cursor.return_value.__enter__.return_value
+    deleted = cursor.executemany.call_args_list[0][0][1]
+    assert sorted(deleted) == [('distance_miles', 0), ('distance_miles', 2017)]
+    inserted = cursor.executemany.call_args_list[1][0][1]
+    assert ('distance_miles', 0, 1, 2, 120.0, day) in inserted
+    assert ('distance_miles', 0, 2, 1, 100.0, datetime.date(2016, 5, 1)) in inserted
+    assert ('distance_miles', 2017, 1, 2, 120.0, day) in inserted
+
+
+@mock.patch('data_fetcher.DBConnection.connect')
+@mock.patch('data_fetcher.DBConnection.fetch_all')
+def test_update_records_nothing_changed(fetch_mocker, connect_mocker, get_db_connection):
+    day = datetime.date(2017, 5, 1)
+    fetch_mocker.side_effect = [[written_activity(1, day, kudos=3)],
+                                [('kudos_count', 0, 3, 1, day), ('kudos_count', 2017, 3, 1, day)]]
+    assert get_db_connection.update_records(activity_ids=[1]) == 0
+    assert not connect_mocker.called
+
+
+@mock.patch('data_fetcher.DBConnection.connect')
+@mock.patch('data_fetcher.DBConnection.top_activities')
+@mock.patch('data_fetcher.DBConnection.fetch_all')
+def test_update_records_rebuilds_when_a_record_gets_worse(fetch_mocker, top_mocker, connect_mocker,
+                                                           get_db_connection):
+    day = datetime.date(2017, 5, 1)
+    fetch_mocker.side_effect = [[written_activity(1, day, kudos=1)],
+                                [('kudos_count', 0, 3, 1, day), ('kudos_count', 2017, 3, 1, day)]]
+    top_mocker.return_value = [(2, 5, day), (1, 1, day)]
+    assert get_db_connection.update_records(activity_ids=[1]) == 2
+    assert sorted(call[0] for call in top_mocker.call_args_list) == [('kudos_count', 0), ('kudos_count', 2017)]
+
+
+@mock.patch('data_fetcher.DBConnection.fetch_all')
+def test_top_activities_for_a_year(fetch_mocker, get_db_connection):
+    get_db_connection.top_activities('distance_miles', 2017)
+    sql, params = fetch_mocker.call_args[0]
+    assert "where distance_miles is not null and _date >= %s and _date < %s order by distance_miles desc" in sql
+    assert params == (datetime.date(2017, 1, 1), datetime.date(2018, 1, 1), 10)
+
+
+@mock.patch('data_fetcher.datetime')
+@mock.patch('data_fetcher.DBConnection.execute_sql')
+@mock.patch('data_fetcher.DBConnection.fetch_all')
+def test_update_training_load_resumes_from_last_day(fetch_mocker, execute_mocker, datetime_mocker, get_db_connection):
+    datetime_mocker.timedelta = datetime.timedelta
+    datetime_mocker.date.today.return_value = datetime.date(2017, 1, 12)
+    fetch_mocker.side_effect = [[(datetime.date(2017, 1, 9), 10.0, 20.0)],
+                                [(datetime.date(2017, 1, 10), 1000)]]
+    assert get_db_connection.update_training_load(since=datetime.date(2017, 1, 10)) == 3
+    rows = execute_mocker.call_args[1]['data']
+    assert [row[0] for row in rows] == [datetime.date(2017, 1, day) for day in (10, 11, 12)]
+    assert [row[1] for row in rows] == [1000, 0, 0]
+    assert rows[0][4] == -10.0
+
+
+@mock.patch('data_fetcher.DBConnection.execute_sql')
+@mock.patch('data_fetcher.DBConnection.fetch_all')
+def test_update_training_load_no_activities(fetch_mocker, execute_mocker, get_db_connection):
+    fetch_mocker.side_effect = [[], [(None,)]]
+    assert get_db_connection.update_training_load(since=datetime.date(2017, 1, 10)) == 0
+    assert not execute_mocker.called
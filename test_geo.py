@@ -0,0 +1,49 @@
+import numpy
+from strava import geo
+
+
+def test_encode():
+    hashes = geo.encode([57.64911, numpy.nan], [10.40744, 1.0])
+    assert hashes[0] == 'u4pruydqq'
+    assert hashes[1] is None
+
+
+def test_encode_point_precision():
+    assert geo.encode_point(51.5, -0.12, precision=5) == 'gcpuv'
+
+
+def test_cell_size():
+    assert geo.cell_size(1) == (45.0, 45.0)
+
+
+def test_bounding_box():
+    min_lat, min_lng, max_lat, max_lng = geo.bounding_box(0, 0, geo.KM_PER_DEGREE_LAT)
+    assert numpy.allclose([min_lat, min_lng, max_lat, max_lng], [-1, -1, 1, 1])
+
+
+def test_covering_cells_cover_points_in_box():
+    box = geo.bounding_box(51.5, -0.12, 5)
+    cells = geo.covering_cells(*box)
+    assert len(cells) <= geo.MAX_COVERING_CELLS
+    latitudes = numpy.random.uniform(box[0], box[2], 1000)
+    longitudes = numpy.random.uniform(box[1], box[3], 1000)
+    for geohash in geo.encode(latitudes, longitudes):
+        assert any(geohash.startswith(cell) for cell in cells)
+
+
+def test_haversine_km():
+    assert round(geo.haversine_km(51.5074, -0.1278, 48.8566, 2.3522)) == 344
+
+
+def test_geohash_migration_writes_a_chunk_in_one_update():
+    import importlib
+    import mock
+    from datawarehouse import setup_django
+    setup_django()
+    migration = importlib.import_module('strava.migrations.0005_typed_coordinates_and_geohash')
+    cursor = mock.MagicMock()
+    migration.write_geohashes(cursor, 'strava_strava', [(1, 57.64911, 10.40744), (2, 51.5, -0.12)])
+    sql, values = cursor.execute.call_args[0]
+    assert cursor.execute.call_count == 1
+    assert "from (values (%s, %s),(%s, %s)) v (activity_id, geohash)" in sql
+    assert values == [1, 'u4pruydqq', 2, 'gcpuvr295']
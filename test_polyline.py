@@ -0,0 +1,48 @@
+import numpy
+from strava import polyline
+
+ENCODED = '_p~iF~ps|U_ulLnnqC_mqNvxq`@'
+DECODED = [[38.5, -120.2], [40.7, -120.95], [43.252, -126.453]]
+
+
+def test_decode():
+    assert numpy.allclose(polyline.decode(ENCODED), DECODED)
+
+
+def test_decode_empty():
+    assert polyline.decode(None).shape == (0, 2)
+
+
+def test_encode():
+    assert polyline.encode(DECODED) == ENCODED
+
+
+def test_round_trip():
+    points = numpy.c_[numpy.linspace(51, 52, 500), numpy.linspace(-1, 0.5, 500) ** 2]
+    assert numpy.allclose(polyline.decode(polyline.encode(points)), points, atol=1e-5)
+
+
+def test_simplify_straight_line():
+    points = numpy.c_[numpy.linspace(0, 1, 100), numpy.linspace(0, 1, 100)]
+    assert numpy.array_equal(polyline.simplify(points, 1e-6), points[[0, -1]])
+
+
+def test_simplify_keeps_corners():
+    points = numpy.array([[0, 0], [0.5, 0.001], [1, 0], [1, 1], [1.0001, 2]])
+    assert numpy.array_equal(polyline.simplify(points, 0.01), points[[0, 2, 4]])
+
+
+def test_build_tiers():
+    points = numpy.c_[51 + numpy.linspace(0, 0.1, 1000), numpy.sin(numpy.linspace(0, 20, 1000)) * 0.01]
+    tiers = polyline.build_tiers(polyline.encode(points))
+    assert len(tiers['polyline_low']) < len(tiers['polyline_medium']) < len(tiers['summary_polyline'])
+
+
+def test_build_tiers_no_route():
+    assert polyline.build_tiers(None) == {'polyline_low': None, 'polyline_medium': None, 'summary_polyline': None}
+
+
+def test_tier_for_zoom():
+    assert polyline.tier_for_zoom(0) == 'polyline_low'
+    assert polyline.tier_for_zoom(13) == 'polyline_medium'
+    assert polyline.tier_for_zoom(20) == 'summary_polyline'
@@ -0,0 +1,95 @@
+import time
+import mock
+from datawarehouse import setup_django
+setup_django()
+from django.http import HttpResponse
+from django.test import RequestFactory, override_settings
+from strava import views
+from strava.middleware import ProfilingMiddleware
+from strava.profiling import Profiler, StackSampler, collapse
+
+
+def busy_wait(seconds):
+    finish = time.time() + seconds
+    while time.time() < finish:
+        pass
+
+
+def test_collapse_is_outermost_first():
+    stack = collapse(__import__('sys')._getframe()).split(';')
+    assert stack[-1] == 'test_profiling.py:test_collapse_is_outermost_first'
+    assert len(stack) > 1
+
+
+def test_stack_sampler_counts_stacks(tmpdir):
+    sampler = StackSampler(interval=0.001)
+    sampler.start()
+    busy_wait(0.05)
+    sampler.stop()
+    assert any(stack.endswith('test_profiling.py:busy_wait') for stack in sampler.counts)
+    path = tmpdir.join('out.collapsed')
+    sampler.write(str(path))
+    stack, count = path.readlines()[0].rsplit(' ', 1)
+    assert int(count) > 0
+
+
+def test_profiler_disabled_writes_nothing(tmpdir):
+    profiler = Profiler(None)
+    with profiler.stage('fetch'):
+        pass
+    assert not profiler.enabled
+    assert profiler.timings == {}
+
+
+def test_profiler_writes_each_stage(tmpdir):
+    profiler = Profiler(str(tmpdir.join('profiles')), run_name='sync')
+    with profiler.stage('fetch'):
+        busy_wait(0.01)
+    with profiler.stage('load'):
+        pass
+    assert list(profiler.timings) == ['fetch', 'load']
+    assert sorted(path.basename for path in tmpdir.join('profiles').listdir()) == \
+        ['sync-fetch.collapsed', 'sync-fetch.prof', 'sync-load.collapsed', 'sync-load.prof']
+    assert 'sync-fetch.collapsed' in profiler.report()
+
+
+def make_request(is_staff=True, **headers):
+    request = RequestFactory().get('/strava/', **headers)
+    request.user = mock.Mock(is_staff=is_staff)
+    return request
+
+
+def run_through_middleware(request, view_func=None):
+    middleware = ProfilingMiddleware()
+    middleware.process_view(request, view_func or views.StravaView.as_view(), (), {})
+    return middleware.process_response(request, HttpResponse())
+
+
+def test_middleware_profiles_with_header(tmpdir):
+    with override_settings(STRAVA_PROFILE_DIR=str(tmpdir)):
+        response = run_through_middleware(make_request(HTTP_X_PROFILE='1'))
+    assert response['X-Profile-Queries'] == '0'
+    assert response['X-Profile-File'].startswith(str(tmpdir))
+    assert sorted(path.ext for path in tmpdir.listdir()) == ['.collapsed', '.prof', '.sql']
+
+
+def test_middleware_profiles_everything_with_setting(tmpdir):
+    with override_settings(STRAVA_PROFILE_DIR=str(tmpdir), STRAVA_PROFILING=True):
+        response = run_through_middleware(make_request())
+    assert 'X-Profile-File' in response
+
+
+def test_middleware_skips_non_admins(tmpdir):
+    with override_settings(STRAVA_PROFILE_DIR=str(tmpdir), STRAVA_PROFILING=True):
+        response = run_through_middleware(make_request(is_staff=False, HTTP_X_PROFILE='1'))
+    assert 'X-Profile-File' not in response
+    assert tmpdir.listdir() == []
+
+
+def test_middleware_skips_other_views(tmpdir):
+    def admin_view(request):
+        return HttpResponse()
+
+    with override_settings(STRAVA_PROFILE_DIR=str(tmpdir), STRAVA_PROFILING=True):
+        response = run_through_middleware(make_request(), view_func=admin_view)
+    assert 'X-Profile-File' not in response
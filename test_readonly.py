@@ -0,0 +1,98 @@
+import json
+import mock
+import pytest
+from wsgiref.util import setup_testing_defaults
+from datawarehouse import setup_django
+setup_django()
+from strava import readonly
+
+ROW = (1, u'Ride London', u'2017-07-30', u'100.1234', u'London', u'United Kingdom', None)
+
+
+@pytest.fixture
+def api():
+    api = readonly.ReadOnlyAPI(tokens=['secret'], page_size=2)
+    api.query = mock.MagicMock()
+    return api
+
+
+def call(api, path='/activities/', token='secret', method='GET', query=''):
+    environ = {'PATH_INFO': path, 'REQUEST_METHOD': method, 'QUERY_STRING': query}
+    if token:
+        environ['HTTP_AUTHORIZATION'] = 'Token ' + token
+    setup_testing_defaults(environ)
+    start_response = mock.MagicMock()
+    body = ''.join(api(environ, start_response))
+    status, headers = start_response.call_args[0]
+    return status, dict(headers), json.loads(body)
+
+
+def test_rejects_missing_token(api):
+    status, headers, body = call(api, token=None)
+    assert status == '401 Unauthorized'
+    assert headers['WWW-Authenticate'] == 'Token'
+    assert not api.query.called
+
+
+def test_rejects_wrong_token(api):
+    assert call(api, token='guess')[0] == '401 Unauthorized'
+
+
+def test_no_tokens_configured_rejects_everything():
+    api = readonly.ReadOnlyAPI(tokens=[])
+    assert call(api, token='anything')[0] == '401 Unauthorized'
+
+
+def test_read_only(api):
+    assert call(api, method='POST')[0] == '405 Method Not Allowed'
+
+
+def test_unknown_path(api):
+    assert call(api, path='/admin/')[0] == '404 Not Found'
+
+
+def test_activities_first_page(api):
+    api.query.side_effect = [[(5,)], [ROW, ROW]]
+    status, headers, body = call(api)
+    assert status == '200 OK'
+    assert body['count'] == 5
+    assert body['previous'] is None
+    assert body['next'] == 'http://127.0.0.1/activities/?page=2'
+    assert body['results'][0] == {'activity_id': 1, 'name': 'Ride London', '_date': '2017-07-30',
+                                  'distance_miles': '100.1234', 'city': 'London', 'country': 'United Kingdom',
+                                  'kilojoules': None}
+    api.query.assert_called_with(readonly.ACTIVITY_PAGE, (2, 0))
+
+
+def test_activities_last_page(api):
+    api.query.side_effect = [[(5,)], [ROW]]
+    body = call(api, query='page=3')[2]
+    assert body['next'] is None
+    assert body['previous'] == 'http://127.0.0.1/activities/?page=2'
+    api.query.assert_called_with(readonly.ACTIVITY_PAGE, (2, 4))
+
+
+def test_activities_page_out_of_range(api):
+    api.query.side_effect = [[(5,)]]
+    assert call(api, query='page=4')[0] == '404 Not Found'
+    assert call(api, query='page=last')[0] == '404 Not Found'
+
+
+def test_summary(api):
+    api.query.return_value = [(2017, 3, 100.5, 3000, 36000, 2500)]
+    body = call(api, path='/summary/')[2]
+    assert body['results'] == [{'year': 2017, 'activities': 3, 'distance_miles': 100.5, 'elevation_feet': 3000,
+                                'moving_time_seconds': 36000, 'kilojoules': 2500}]
+
+
+def test_prepared_query_prepares_once_per_connection():
+    query = readonly.PreparedQuery('test_query', 'select $1', parameters=1)
+    cursor = mock.MagicMock()
+    query.execute(cursor, (1,))
+    query.execute(cursor, (2,))
+    assert cursor.execute.call_args_list == [mock.call('prepare test_query as select $1'),
+                                             mock.call('execute test_query(%s)', (1,)),
+                                             mock.call('execute test_query(%s)', (2,))]
+    cursor.connection = mock.MagicMock()
+    query.execute(cursor, (3,))
+    assert cursor.execute.call_args_list[-2] == mock.call('prepare test_query as select $1')
@@ -0,0 +1,50 @@
+import datetime
+from strava.records import Leaderboard
+
+DAY = datetime.date(2017, 1, 1)
+
+
+def test_keeps_the_best_entries():
+    board = Leaderboard(size=3)
+    for activity_id, value in enumerate([5.0, 1.0, 9.0, 3.0, 7.0]):
+        board.offer(value, activity_id, DAY)
+    assert [value for value, _, _ in board.ranked()] == [9.0, 7.0, 5.0]
+
+
+def test_ignores_missing_values():
+    board = Leaderboard(size=3)
+    board.offer(None, 1, DAY)
+    board.offer(float('nan'), 2, DAY)
+    assert board.ranked() == []
+
+
+def test_update_adds_new_activity():
+    board = Leaderboard([(5.0, 1, DAY)], size=2)
+    board.update(6.0, 2, DAY)
+    assert board.ranked() == [(6.0, 2, DAY), (5.0, 1, DAY)]
+    assert not board.stale
+
+
+def test_update_improves_activity_in_place():
+    board = Leaderboard([(5.0, 1, DAY), (4.0, 2, DAY)], size=2)
+    board.update(8.0, 2, DAY)
+    assert board.ranked() == [(8.0, 2, DAY), (5.0, 1, DAY)]
+
+
+def test_update_unchanged_activity():
+    board = Leaderboard([(5.0, 1, DAY)], size=2)
+    board.update(5.0, 1, DAY)
+    assert board.ranked() == [(5.0, 1, DAY)]
+    assert not board.stale
+
+
+def test_update_worse_activity_marks_stale():
+    board = Leaderboard([(5.0, 1, DAY), (4.0, 2, DAY)], size=2)
+    board.update(1.0, 1, DAY)
+    assert board.stale
+
+
+def test_update_missing_value_marks_stale():
+    board = Leaderboard([(5.0, 1, DAY)], size=2)
+    board.update(None, 1, DAY)
+    assert board.stale
@@ -0,0 +1,60 @@
+import datetime
+import json
+import mock
+import numpy
+import pytest
+from datawarehouse import setup_django
+setup_django()
+from django.utils import timezone
+from strava import snapshot
+
+ROW = (1, u'Ride London', datetime.date(2017, 7, 30), 100.0, None, 18000, 19000, None, 3000.0, 2500.0,
+       u'United Kingdom', None, 51.5, -0.12, u'gcpuvr295', False, 3, u'_p~iF~ps|U_ulLnnqC')
+
+
+@pytest.fixture
+def exporter(tmpdir):
+    exporter = snapshot.SnapshotExporter(str(tmpdir.join('snapshots')))
+    exporter.change_marker = mock.MagicMock(return_value=datetime.datetime(2017, 10, 1, 12, tzinfo=timezone.utc))
+    exporter.changed_years = mock.MagicMock(return_value=[2016, 2017])
+    exporter.year_rows = mock.MagicMock(return_value=[ROW])
+    return exporter
+
+
+def test_to_columns():
+    columns = snapshot.to_columns([ROW])
+    assert sorted(columns) == sorted(snapshot.FIELDS)
+    assert columns['_date'][0] == numpy.datetime64('2017-07-30')
+    assert numpy.isnan(columns['avg_power'][0])
+    assert columns['kudos_count'][0] == 0
+    assert columns['city'][0] == u''
+    assert columns['name'].dtype.kind == 'U'
+
+
+def test_to_columns_empty():
+    assert len(snapshot.to_columns([])['activity_id']) == 0
+
+
+def test_first_export_writes_every_year(exporter):
+    assert exporter.export() == [2016, 2017]
+    exporter.changed_years.assert_called_with(None)
+    manifest = json.load(open(exporter.path(snapshot.MANIFEST)))
+    assert manifest['exported_at'] == '2017-10-01T12:00:00+00:00'
+    assert manifest['partitions']['2017'] == {'file': 'activities-2017.npz', 'rows': 1}
+    columns = snapshot.read_partition(exporter.path('activities-2017.npz'))
+    assert columns['name'][0] == u'Ride London'
+    assert columns['activity_id'].dtype == numpy.int64
+
+
+def test_later_export_only_asks_for_changes(exporter):
+    exporter.export()
+    exporter.changed_years.return_value = [2017]
+    assert exporter.export() == [2017]
+    exporter.changed_years.assert_called_with(datetime.datetime(2017, 10, 1, 12, tzinfo=timezone.utc))
+    assert sorted(json.load(open(exporter.path(snapshot.MANIFEST)))['partitions']) == ['2016', '2017']
+
+
+def test_full_export_ignores_manifest(exporter):
+    exporter.export()
+    exporter.export(full=True)
+    exporter.changed_years.assert_called_with(None)
@@ -0,0 +1,108 @@
+import datetime
+import pytest
+import requests
+import data_fetcher
+import strava_standin
+
+
+@pytest.fixture
+def standin(request):
+    def start(activities=250, **faults):
+        server = strava_standin.StandInServer(('127.0.0.1', 0), strava_standin.SyntheticAthlete(activities=activities),
+                                              strava_standin.Faults(**faults))
+        server.start_in_background()
+        request.addfinalizer(server.shutdown)
+        request.addfinalizer(server.server_close)
+        return server
+    return start
+
+
+@pytest.fixture
+def connect(request):
+    def make(server):
+        connector = data_fetcher.StravaConnector(token='token', base_url=server.api_url)
+        # close the keep-alive connection before the server goes away
+        request.addfinalizer(connector.reset)
+        return connector
+    return make
+
+
+def get(server, path, **params):
+    params.setdefault('access_token', 'token')
+    return requests.get(server.api_url + path, params=params)
+
+
+def test_activities_are_deterministic():
+    first = strava_standin.SyntheticAthlete(seed=1).activity(10)
+    assert first == strava_standin.SyntheticAthlete(seed=1).activity(10)
+    assert first != strava_standin.SyntheticAthlete(seed=2).activity(10)
+
+
+def test_numbers_between():
+    athlete = strava_standin.SyntheticAthlete(activities=100)
+    newest = (strava_standin.NEWEST_START - datetime.datetime(1970, 1, 1)).total_seconds()
+    day = 24 * 3600
+    assert athlete.numbers_between() == (1, 100)
+    assert athlete.numbers_between(after=newest - 2.5 * day) == (1, 3)
+    assert athlete.numbers_between(before=newest - day) == (3, 100)
+
+
+def test_activities_paging(standin):
+    server = standin(activities=250)
+    pages = [get(server, '/athlete/activities', page=page, per_page=100).json() for page in (1, 2, 3, 4)]
+    assert [len(page) for page in pages] == [100, 100, 50, 0]
+    assert pages[0][0]['start_date'] > pages[0][1]['start_date']
+
+
+def test_requires_token(standin):
+    assert get(standin(), '/athlete', access_token='').status_code == 401
+
+
+def test_activity_and_streams(standin):
+    server = standin()
+    activity = get(server, '/athlete/activities', per_page=1).json()[0]
+    assert get(server, '/activities/{id}'.format(id=activity['id'])).json()['resource_state'] == 3
+    streams = get(server, '/activities/{id}/streams/time,watts'.format(id=activity['id']), resolution='low').json()
+    assert [stream['type'] for stream in streams] == ['time', 'watts']
+    assert len(streams[0]['data']) <= 100
+    assert get(server, '/activities/1').status_code == 404
+
+
+def test_rate_limit_headers_and_throttling(standin):
+    server = standin(short_limit=2)
+    responses = [get(server, '/athlete') for _ in range(3)]
+    assert [response.status_code for response in responses] == [200, 200, 429]
+    assert responses[1].headers['X-RateLimit-Usage'] == '2,2'
+    assert responses[1].headers['X-RateLimit-Limit'] == '2,30000'
+
+
+def test_error_rate(standin):
+    server = standin(error_rate=1.0)
+    assert get(server, '/athlete').status_code in (500, 502, 503)
+
+
+def test_connector_against_standin(standin, connect):
+    server = standin(activities=450)
+    connector = connect(server)
+    activities = connector.get_activities()
+    assert len(activities) == 450
+    assert connector.get_details()['first_name'] == 'Stand'
+    after = datetime.datetime(2017, 9, 28)
+    assert len(connector.get_activities(after=after)) == 4
+
+
+def test_connector_shares_one_session(standin, connect):
+    server = standin(activities=450)
+    connector = connect(server)
+    connector.get_activities()
+    connector.get_details()
+    # one auth check (which also fetches the athlete) and three pages of activities
+    assert connector.take_call_count() == 4
+    assert server.connection_count == 1
+
+
+def test_responses_are_compressed(standin):
+    server = standin()
+    response = get(server, '/athlete')
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert response.json()['firstname'] == 'Stand'
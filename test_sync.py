@@ -0,0 +1,122 @@
+import pytest
+import mock
+import datetime
+import sync
+from StringIO import StringIO
+
+
+@pytest.fixture
+def syncer(tmpdir):
+    connector = mock.MagicMock()
+    db = mock.MagicMock()
+    db.get_latest_activity_date.return_value = None
+    return sync.StravaSync(connector=connector, db=db, update_fields=['kudos_count'], interval=10, jitter=0,
+                           lock_path=str(tmpdir.join('sync.lock')))
+
+
+def test_get_start_from_empty_table(syncer):
+    syncer.db.get_latest_activity_date.return_value = None
+    assert syncer.get_start_from() is None
+
+
+def test_get_start_from(syncer):
+    syncer.db.get_latest_activity_date.return_value = datetime.date(2017, 1, 1)
+    assert syncer.get_start_from() == datetime.datetime(2017, 1, 1)
+
+
+@mock.patch('sync.ActivityBatch')
+def test_run_once(batch_mocker, syncer):
+    syncer.db.get_latest_activity_date.return_value = datetime.date(2017, 1, 1)
+    syncer.connector.fetch_activities.return_value = [(1, 'Ride')]
+    syncer.db.insert_data.return_value = 1
+    assert syncer.run_once() == 1
+    syncer.connector.fetch_activities.assert_called_with(after=datetime.datetime(2017, 1, 1),
+                                                         conn=syncer.connector.get_connection.return_value)
+    batch_mocker.from_activities.assert_called_with([(1, 'Ride')])
+    syncer.db.insert_data.assert_called_with(data=batch_mocker.from_activities.return_value,
+                                             update_fields=['kudos_count'])
+
+
+@mock.patch('sync.ActivityBatch')
+def test_run_once_profiles_stages(batch_mocker, syncer, tmpdir):
+    syncer.profile_dir = str(tmpdir.join('profiles'))
+    syncer.connector.fetch_activities.return_value = [(1, 'Ride')]
+    syncer.run_once()
+    files = [path.basename for path in tmpdir.join('profiles').listdir()]
+    assert sorted(name.split('-')[-1] for name in files) == ['fetch.collapsed', 'fetch.prof', 'load.collapsed',
+                                                             'load.prof', 'transform.collapsed', 'transform.prof']
+
+
+def test_run_once_reuses_client(syncer):
+    syncer.connector.fetch_activities.return_value = []
+    syncer.run_once()
+    syncer.run_once()
+    assert syncer.connector.get_connection.call_count == 1
+    assert not syncer.db.insert_data.called
+
+
+def test_run_once_skips_when_locked(syncer):
+    with sync.SyncLock(syncer.lock.path):
+        assert syncer.run_once() is None
+    assert not syncer.connector.fetch_activities.called
+
+
+def test_run_forever_stops(syncer):
+    syncer.connector.fetch_activities.return_value = []
+
+    def stop_after_first_sync(*args, **kwargs):
+        syncer.stop()
+        return []
+
+    syncer.connector.fetch_activities.side_effect = stop_after_first_sync
+    syncer.run_forever()
+    assert syncer.connector.fetch_activities.call_count == 1
+    syncer.db.close.assert_called_with()
+
+
+def test_run_forever_survives_failed_sync(syncer):
+    calls = []
+
+    def fail_then_stop(*args, **kwargs):
+        calls.append(1)
+        if len(calls) == 2:
+            syncer.stop()
+            return []
+        raise Exception("API down")
+
+    syncer.interval = 0
+    syncer.connector.fetch_activities.side_effect = fail_then_stop
+    syncer.run_forever()
+    assert len(calls) == 2
+    assert syncer.connector.get_connection.call_count == 2
+
+
+@pytest.fixture
+def sync_command():
+    from datawarehouse import setup_django
+    setup_django()
+    from strava.management.commands import sync_strava
+    with mock.patch.object(sync_strava, 'StravaConnector'), mock.patch.object(sync_strava, 'DBConnection'), \
+            mock.patch.object(sync_strava, 'StravaSync') as sync_mocker:
+        yield sync_strava.Command(stdout=StringIO()), sync_mocker.return_value
+
+
+def run_command(command):
+    command.handle(daemon=False, interval=10, jitter=0, lock_file='sync.lock', config='config.conf',
+                   section='local', profile=None)
+    return command.stdout._out.getvalue().strip()
+
+
+def test_sync_command_reports_held_lock(sync_command):
+    command, syncer = sync_command
+    syncer.run_once.return_value = None
+    assert run_command(command) == "Another sync is already running"
+    syncer.db.close.assert_called_with()
+
+
+def test_sync_command_closes_db_on_failure(sync_command):
+    command, syncer = sync_command
+    syncer.run_once.side_effect = Exception("API down")
+    with pytest.raises(Exception):
+        run_command(command)
+    syncer.db.close.assert_called_with()
@@ -0,0 +1,38 @@
+import datetime
+import math
+import numpy
+from strava import training_load
+
+
+def test_ewma_matches_recurrence():
+    loads = numpy.random.uniform(0, 1000, 1000)
+    decay = math.exp(-1.0 / 42)
+    value, expected = 50.0, []
+    for load in loads:
+        value += (1 - decay) * (load - value)
+        expected.append(value)
+    assert numpy.allclose(training_load.ewma(loads, 42, initial=50.0), expected)
+
+
+def test_ewma_is_resumable():
+    loads = numpy.random.uniform(0, 1000, 300)
+    full = training_load.ewma(loads, 7)
+    resumed = training_load.ewma(loads[200:], 7, initial=full[199])
+    assert numpy.allclose(full[200:], resumed)
+
+
+def test_ewma_empty():
+    assert len(training_load.ewma([], 7)) == 0
+
+
+def test_daily_loads():
+    days, loads = training_load.daily_loads(['2017-01-01', '2017-01-01', '2017-01-03', '2016-12-31'], [1, 2, None, 5],
+                                            start=datetime.date(2017, 1, 1), end=datetime.date(2017, 1, 4))
+    assert days.tolist() == [datetime.date(2017, 1, day) for day in range(1, 5)]
+    assert loads.tolist() == [3, 0, 0, 0]
+
+
+def test_training_load_tsb_is_previous_day():
+    ctl, atl, tsb = training_load.training_load([100, 0, 0], initial_ctl=10, initial_atl=5)
+    assert tsb[0] == 5
+    assert numpy.allclose(tsb[1:], (ctl - atl)[:-1])
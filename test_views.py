@@ -0,0 +1,125 @@
+import pytest
+from datawarehouse import setup_django
+setup_django()
+from rest_framework.exceptions import ValidationError
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from strava import views
+
+
+def get_queryset(view_class, **params):
+    view = view_class()
+    view.request = Request(APIRequestFactory().get('/strava/', params))
+    return view.get_queryset()
+
+
+def test_strava_view_without_filters():
+    assert 'WHERE' not in str(get_queryset(views.StravaView).query)
+
+
+def test_strava_view_radius_filter():
+    sql = str(get_queryset(views.StravaView, lat=51.5, lng=-0.12, radius_km=5).query)
+    assert '"strava_strava"."geohash"::text LIKE gcpuv%' in sql
+    assert 'asin(sqrt(' in sql
+    assert '"strava_strava"."latitude" BETWEEN' in sql
+
+
+def test_strava_view_box_filter():
+    sql = str(get_queryset(views.StravaView, min_lat=51, min_lng=-1, max_lat=52, max_lng=0).query)
+    assert '"strava_strava"."longitude" BETWEEN -1.0 AND 0.0' in sql
+    assert 'asin' not in sql
+
+
+def test_strava_view_incomplete_point():
+    with pytest.raises(ValidationError):
+        get_queryset(views.StravaView, lat=51.5, lng=-0.12)
+
+
+def test_strava_view_bad_number():
+    with pytest.raises(ValidationError):
+        get_queryset(views.StravaView, lat='north', lng=-0.12, radius_km=1)
+
+
+@pytest.mark.parametrize('params', [
+    {'lat': 'nan', 'lng': 0, 'radius_km': 5},
+    {'lat': 51.5, 'lng': 'inf', 'radius_km': 5},
+    {'lat': 91, 'lng': 0, 'radius_km': 5},
+    {'lat': 51.5, 'lng': -181, 'radius_km': 5},
+    {'lat': 51.5, 'lng': 0, 'radius_km': 0},
+    {'lat': 51.5, 'lng': 0, 'radius_km': -5},
+    {'min_lat': -1e300, 'max_lat': 1e300, 'min_lng': 0, 'max_lng': 1},
+    {'min_lat': 52, 'max_lat': 51, 'min_lng': 0, 'max_lng': 1},
+    {'min_lat': 51, 'max_lat': 52, 'min_lng': 1, 'max_lng': 0},
+])
+def test_strava_view_location_out_of_range(params):
+    with pytest.raises(ValidationError):
+        get_queryset(views.StravaView, **params)
+
+
+def test_strava_view_whole_world_box():
+    sql = str(get_queryset(views.StravaView, min_lat=-90, min_lng=-180, max_lat=90, max_lng=180).query)
+    assert '"strava_strava"."latitude" BETWEEN -90.0 AND 90.0' in sql
+
+
+def test_strava_view_search():
+    sql = str(get_queryset(views.StravaView, search='ride london').query)
+    assert '"strava_strava"."name_search"' not in sql.split('FROM')[0]
+    assert "name_search @@ plainto_tsquery('english', ride london)" in sql
+    assert sql.endswith('ORDER BY "search_rank" DESC')
+
+
+def test_strava_view_blank_search():
+    assert 'WHERE' not in str(get_queryset(views.StravaView, search=' ').query)
+
+
+def test_strava_map_view_picks_tier_for_zoom():
+    assert 'polyline_low' in str(get_queryset(views.StravaMapView, zoom=5).query)
+    assert 'polyline_medium' in str(get_queryset(views.StravaMapView, zoom=12).query)
+    assert 'summary_polyline' in str(get_queryset(views.StravaMapView, zoom=16).query)
+
+
+def test_strava_map_view_default_zoom():
+    assert 'polyline_low' in str(get_queryset(views.StravaMapView).query)
+
+
+def test_training_load_view_date_range():
+    sql = str(get_queryset(views.TrainingLoadView, start='2017-01-01', end='2017-12-31').query)
+    assert '"strava_trainingload"."date" >= 2017-01-01' in sql
+    assert '"strava_trainingload"."date" <= 2017-12-31' in sql
+
+
+def test_training_load_view_bad_date():
+    with pytest.raises(ValidationError):
+        get_queryset(views.TrainingLoadView, start='yesterday')
+
+
+def test_strava_serializer_keeps_decimal_output():
+    from strava.models import Strava
+    from strava.serializers import StravaSerializer
+    activity = Strava(activity_id=1, name='Ride', _date='2017-01-01', distance_miles=12.34, kilojoules=None)
+    data = StravaSerializer(activity).data
+    assert data['distance_miles'] == '12.3400'
+    assert data['kilojoules'] is None
+
+
+def test_personal_record_view_defaults_to_all_time():
+    sql = str(get_queryset(views.PersonalRecordView).query)
+    assert '"strava_personalrecord"."year" = 0' in sql
+    assert 'INNER JOIN "strava_strava"' in sql
+
+
+def test_personal_record_view_metric_and_year():
+    sql = str(get_queryset(views.PersonalRecordView, metric='kudos_count', year=2017).query)
+    assert '"strava_personalrecord"."year" = 2017' in sql
+    assert '"strava_personalrecord"."metric" = kudos_count' in sql
+
+
+def test_personal_record_view_unknown_metric():
+    with pytest.raises(ValidationError):
+        get_queryset(views.PersonalRecordView, metric='watts')
+
+
+@pytest.mark.parametrize('year', ['nan', 'inf', '2017.9', 'last', '40000'])
+def test_personal_record_view_bad_year(year):
+    with pytest.raises(ValidationError):
+        get_queryset(views.PersonalRecordView, year=year)
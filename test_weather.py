@@ -1,6 +1,7 @@
 import pytest
 import mock
 import weather
+import cache
 
 MOCKED_API_KEY = 'abc123'
 MOCKED_ENV_VARS = {'OPEN_WEATHER_MAP_API_KEY': MOCKED_API_KEY}
@@ -160,3 +161,88 @@ def test_build_weather_dict(weather_data_mocker, wind_mocker, compass_mocker, wi
                 'forecast_timestamp': "2010-01-01"}
 
     assert weather_obj_with_default_city.build_weather_dict() == expected
+
+
+@pytest.fixture
+def memory_cache():
+    return cache.TTLCache(ttl=600)
+
+
+@mock.patch('weather.Weather.fetch_weather_data')
+@mock.patch('weather.Weather.get_api_key')
+def test_get_weather_data_is_cached(api_key_mocker, fetch_mocker, memory_cache):
+    fetch_mocker.return_value = MOCKED_JSON_RESPONSE
+    weather_obj = weather.Weather(use_default=True, cache=memory_cache)
+    assert weather_obj.get_weather_data() == MOCKED_JSON_RESPONSE
+    assert weather_obj.get_weather_data() == MOCKED_JSON_RESPONSE
+    assert fetch_mocker.call_count == 1
+
+
+@mock.patch('weather.Weather.get_country_code')
+@mock.patch('weather.Weather.get_city_name')
+@mock.patch('weather.json.load')
+@mock.patch('weather.Weather.get_api_key')
+def test_get_city_id_is_cached(api_key_mocker, json_obj_mocker, city_name_mocker, country_code_mocker, memory_cache):
+    json_obj_mocker.return_value = MOCKED_CITY_LIST_JSON
+    city_name_mocker.return_value = 'london'
+    country_code_mocker.return_value = 'gb'
+    with mock.patch('weather.open', mock.mock_open(), create=True):
+        assert weather.Weather(cache=memory_cache).get_city_id() == 100
+        assert weather.Weather(cache=memory_cache).get_city_id() == 100
+    assert json_obj_mocker.call_count == 1
+
+
+@pytest.fixture
+def multi_city_weather():
+    return weather.MultiCityWeather(api_key=MOCKED_API_KEY, session=mock.MagicMock())
+
+
+def group_response(*city_ids):
+    cities = [dict(MOCKED_JSON_RESPONSE, id=city_id, wind={'speed': 5.1, 'deg': 220}) for city_id in city_ids]
+    response = mock.MagicMock(ok=True)
+    response.json.return_value = {'cnt': len(cities), 'list': cities}
+    return response
+
+
+def test_split_into_groups():
+    groups = weather.MultiCityWeather.split_into_groups(range(45))
+    assert [len(group) for group in groups] == [20, 20, 5]
+
+
+def test_build_group_url(multi_city_weather):
+    assert multi_city_weather.build_group_url([1, 2]) == weather.GROUP_API_URL + '1,2&units=metric&APPID=' + MOCKED_API_KEY
+
+
+def test_build_weather_dicts(multi_city_weather):
+    multi_city_weather.session.get.side_effect = lambda url, timeout: group_response(
+        *[int(city_id) for city_id in url.split('id=')[1].split('&')[0].split(',')])
+    results, errors = multi_city_weather.build_weather_dicts(range(1, 31))
+    assert sorted(results) == range(1, 31)
+    assert errors == {}
+    assert multi_city_weather.session.get.call_count == 2
+    assert results[1]['city_name'] == 'London'
+    assert results[1]['wind_direction_compass'] == 'SW'
+
+
+def test_build_weather_dicts_partial_failure(multi_city_weather):
+    multi_city_weather.session.get.return_value = group_response(1)
+    results, errors = multi_city_weather.build_weather_dicts([1, 2])
+    assert list(results) == [1]
+    assert list(errors) == [2]
+
+
+def test_build_weather_dicts_failed_group(multi_city_weather):
+    multi_city_weather.session.get.return_value = mock.MagicMock(ok=False, status_code=401)
+    multi_city_weather.session.get.return_value.json.return_value = {'message': 'Invalid API key'}
+    results, errors = multi_city_weather.build_weather_dicts([1, 2])
+    assert results == {}
+    assert errors[1] == "Error calling Weather API(Error Code: 401): Invalid API key"
+
+
+def test_build_weather_dicts_uses_cache(multi_city_weather, memory_cache):
+    multi_city_weather.cache = memory_cache
+    multi_city_weather.session.get.return_value = group_response(1)
+    multi_city_weather.build_weather_dicts([1])
+    results, errors = multi_city_weather.build_weather_dicts([1])
+    assert list(results) == [1]
+    assert multi_city_weather.session.get.call_count == 1
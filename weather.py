@@ -2,24 +2,42 @@ import os
 import json
 import requests
 import datetime
+from multiprocessing.pool import ThreadPool
+from cache import TTLCache
 
 PATH_TO_CITY_LIST = os.path.dirname(os.path.abspath(__file__)) + '/strava/city.list.json'
 API_URL = 'http://api.openweathermap.org/data/2.5/weather?id='
+GROUP_API_URL = 'http://api.openweathermap.org/data/2.5/group?id='
+# The group endpoint accepts at most 20 city ids per call
+GROUP_SIZE = 20
+GROUP_WORKERS = 4
 COMPASS_VALUES = ["N", "NNE", "NE", "ENE", "E", "ESE", "SE", "SSE", "S", "SSW", "SW", "WSW", "W", "WNW", "NW", "NNW"]
 LONDON_ID = 2643743
+# OpenWeatherMap only refreshes its data roughly every 10 minutes
+CACHE_TTL = 10 * 60
+CACHE_PATH = os.path.join(os.path.expanduser('~'), '.strava_data_weather_cache')
 
 
 class APIException(Exception):
     pass
 
 
+def default_cache(background=True):
+    """
+    :param background: refresh stale entries on a background thread, only safe for long running processes
+    :return: cache for weather responses and city ids, shared between processes through a file in your home directory
+    """
+    return TTLCache(ttl=CACHE_TTL, path=os.environ.get('WEATHER_CACHE_PATH', CACHE_PATH), background=background)
+
+
 class Weather(object):
 
-    def __init__(self, city_id=None, use_default=False):
+    def __init__(self, city_id=None, use_default=False, cache=None):
 
         self.api_key = self.get_api_key()
         self.city_id = LONDON_ID if use_default else city_id
         self.try_counter = 0
+        self.cache = cache
 
     @staticmethod
     def get_api_key():
@@ -42,10 +60,16 @@ class Weather(object):
         if self.city_id:
             assert isinstance(self.city_id, int)
             return self.city_id
+        city_name = self.get_city_name()
+        country_code = self.get_country_code()
+        # city ids never change, so a cached id is used regardless of its age
+        city_key = 'city:{name}:{country}'.format(name=city_name.title(), country=country_code.upper())
+        cached = self.cache.get_entry(city_key) if self.cache else None
+        if cached:
+            self.city_id = cached[1]
+            return self.city_id
         with open(PATH_TO_CITY_LIST) as city_file:
             cities = json.load(city_file)
-            city_name = self.get_city_name()
-            country_code = self.get_country_code()
             city = [x for x in cities if x['name'] == city_name.title() and x['country'] == country_code.upper()]
             if not city:
                 print "Could not find City: {city} in Country: {country}. Please try again...".format(city=city_name, country=country_code)
@@ -55,9 +79,14 @@ class Weather(object):
                 city = self.get_city_id()
         if not city:
             return None
+        if isinstance(city, int):
+            return city
         if len(city) > 1:
             print "There are {results} results for that City / Country choice! First occurrence will be used".format(results=len(city))
-        return city[0]['id']
+        self.city_id = city[0]['id']
+        if self.cache:
+            self.cache.set(city_key, self.city_id)
+        return self.city_id
 
     def build_url(self, unit='metric'):
         """
@@ -67,6 +96,16 @@ class Weather(object):
         return API_URL + str(self.get_city_id()) + '&units=' + unit + '&APPID=' + self.api_key
 
     def get_weather_data(self):
+        """
+        Gets the current weather, from the cache if we have one and the data is recent enough
+        :return: weather API response
+        """
+        if not self.cache:
+            return self.fetch_weather_data()
+        key = 'weather:{city_id}:metric'.format(city_id=self.get_city_id())
+        return self.cache.get_or_fetch(key, self.fetch_weather_data)
+
+    def fetch_weather_data(self):
         response = requests.get(url=self.build_url(), timeout=5)
         if response.ok:
             return response.json()
@@ -103,8 +142,16 @@ class Weather(object):
                 'direction': wind_direction}
 
     def build_weather_dict(self):
-        weather_dict = self.get_weather_data()
-        wind_details = self.get_wind_details(wind_dict=weather_dict.get('wind'))
+        return self.parse_weather_dict(self.get_weather_data())
+
+    @classmethod
+    def parse_weather_dict(cls, weather_dict):
+        """
+        Transforms a single city's weather API response into our flat dict
+        :param weather_dict: weather API response for one city
+        :return: dict of the weather details we care about
+        """
+        wind_details = cls.get_wind_details(wind_dict=weather_dict.get('wind'))
         return dict(
             city_name=weather_dict.get('name'),
             cloud_cover_percentage=weather_dict.get('clouds').get('all'),
@@ -112,7 +159,99 @@ class Weather(object):
             min_temp=weather_dict.get('main').get('temp_min'),
             max_temp=weather_dict.get('main').get('temp_max'),
             pressure=weather_dict.get('main').get('pressure'),
-            wind_direction_compass=self.degrees_to_compass(degrees=wind_details.get('direction')),
-            wind_speed=self.meters_per_second_to_mph(mps=wind_details.get('speed')),
-            forecast_timestamp=self.unix_to_timestamp(unix=weather_dict.get('dt'))
+            wind_direction_compass=cls.degrees_to_compass(degrees=wind_details.get('direction')),
+            wind_speed=cls.meters_per_second_to_mph(mps=wind_details.get('speed')),
+            forecast_timestamp=cls.unix_to_timestamp(unix=weather_dict.get('dt'))
                     )
+
+
+class MultiCityWeather(object):
+
+    """
+    Gets the weather for many cities at once, using OpenWeatherMap's group endpoint and a small pool of threads
+    sharing one keep-alive session
+    """
+
+    def __init__(self, api_key=None, max_workers=GROUP_WORKERS, cache=None, session=None):
+        self.api_key = api_key or Weather.get_api_key()
+        self.max_workers = max_workers
+        self.cache = cache
+        if session is None:
+            session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=max_workers)
+            session.mount('http://', adapter)
+        self.session = session
+
+    @staticmethod
+    def cache_key(city_id, unit='metric'):
+        return 'weather:{city_id}:{unit}'.format(city_id=city_id, unit=unit)
+
+    @staticmethod
+    def split_into_groups(city_ids, size=GROUP_SIZE):
+        city_ids = sorted(set(city_ids))
+        return [city_ids[i:i + size] for i in range(0, len(city_ids), size)]
+
+    def build_group_url(self, city_ids, unit='metric'):
+        return GROUP_API_URL + ','.join(str(city_id) for city_id in city_ids) + '&units=' + unit + '&APPID=' + self.api_key
+
+    def fetch_group(self, city_ids):
+        """
+        Calls the group endpoint for up to GROUP_SIZE cities
+        :param city_ids: list of city ids
+        :return: tuple of ({city_id: weather API response}, {city_id: error message})
+        """
+        try:
+            response = self.session.get(url=self.build_group_url(city_ids), timeout=5)
+        except requests.exceptions.RequestException as e:
+            return {}, dict((city_id, "Error calling Weather API: {error}".format(error=e)) for city_id in city_ids)
+        if not response.ok:
+            try:
+                message = response.json().get('message')
+            except ValueError:
+                message = response.reason
+            error = "Error calling Weather API(Error Code: {code}): {message}".format(code=response.status_code,
+                                                                                      message=message)
+            return {}, dict((city_id, error) for city_id in city_ids)
+
+        responses = dict((city['id'], city) for city in response.json().get('list', []))
+        errors = dict((city_id, "No weather returned for city {city_id}".format(city_id=city_id))
+                      for city_id in city_ids if city_id not in responses)
+        return responses, errors
+
+    def build_weather_dicts(self, city_ids):
+        """
+        Gets the weather for every city, reporting failures per city rather than failing the whole batch
+        :param city_ids: iterable of city ids
+        :return: tuple of ({city_id: weather dict as built by Weather.build_weather_dict}, {city_id: error message})
+        """
+        responses, errors = {}, {}
+        to_fetch = []
+        for city_id in set(city_ids):
+            cached = self.cache.get(self.cache_key(city_id)) if self.cache else None
+            if cached is not None:
+                responses[city_id] = cached
+            else:
+                to_fetch.append(city_id)
+
+        groups = self.split_into_groups(to_fetch)
+        if groups:
+            pool = ThreadPool(min(self.max_workers, len(groups)))
+            try:
+                for group_responses, group_errors in pool.map(self.fetch_group, groups):
+                    responses.update(group_responses)
+                    errors.update(group_errors)
+            finally:
+                pool.close()
+                pool.join()
+            if self.cache:
+                for city_id in to_fetch:
+                    if city_id in responses:
+                        self.cache.set(self.cache_key(city_id), responses[city_id])
+
+        weather = {}
+        for city_id, response in responses.items():
+            try:
+                weather[city_id] = Weather.parse_weather_dict(response)
+            except (AttributeError, TypeError) as e:
+                errors[city_id] = "Could not parse weather for city {city_id}: {error}".format(city_id=city_id, error=e)
+        return weather, errors